@@ -0,0 +1,316 @@
+# encoding: utf8
+"""
+Benchmarks for settingsd assembly, lookup and memory
+
+Generates synthetic settings.d trees in a temporary directory and writes
+machine-readable results:
+
+    python benchmarks/bench.py run -o before.json
+    python benchmarks/bench.py run -o after.json --fragments 500 --paths 8
+    python benchmarks/bench.py compare before.json after.json
+
+Times are in seconds (best of --repeat runs), reads in nanoseconds per
+lookup and memory in bytes (tracemalloc peak during assembly).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import types
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import settingsd
+from settingsd import cache
+from settingsd import finders
+from settingsd import utils
+
+
+SCENARIOS = ['flat', 'overlay', 'json', 'zip']
+
+
+def build_tree(root, name, opts, scenario):
+    """
+    Write a synthetic tree for scenario; return the seed for install()
+    """
+    pkg = os.path.join(root, name)
+    base = os.path.join(pkg, 'settings.d')
+    os.makedirs(base)
+    with open(os.path.join(pkg, '__init__.py'), 'w') as fp:
+        fp.write('')
+
+    archive = os.path.join(root, name + '.zip')
+    overlays = list()
+    if scenario in ('overlay', 'zip'):
+        overlays = [
+            os.path.join(root, 'overlay{0}.d'.format(i))
+            for i in range(opts.paths)
+            ]
+        for overlay in overlays:
+            os.makedirs(overlay)
+
+    dirs = [base] + overlays
+    # paths as fragments will see them: on disk or inside the archive
+    overlay_refs = overlays
+    if scenario == 'zip':
+        overlay_refs = [
+            os.path.join(archive, os.path.relpath(overlay, root))
+            for overlay in overlays
+            ]
+
+    for i in range(opts.fragments):
+        target = dirs[i % len(dirs)]
+        lines = ['KEY_{0}_{1} = {2!r}'.format(i, k, [i, k, 'x' * 16])
+                 for k in range(opts.keys)]
+        if i == 0 and overlays:
+            # extend the search path from inside a fragment
+            lines.append('__path__.extend({0!r})'.format(overlay_refs))
+        if i % 10 == 5:
+            lines.append('if not UNDEFINED_{0}:'.format(i))
+            lines.append('    UNDEFINED_{0} = {0}'.format(i))
+        path = os.path.join(target, '{0:04d}-part{0}.py'.format(i))
+        with open(path, 'w') as fp:
+            fp.write('\n'.join(lines) + '\n')
+
+    if scenario == 'json':
+        size, items = 0, dict()
+        target = opts.json_mb * 1024 * 1024
+        while size < target:
+            key = 'ROUTE_{0}'.format(len(items))
+            items[key] = ['/path/{0}/{1}'.format(len(items), n)
+                          for n in range(32)]
+            size += 16 * 32 + 32
+        with open(os.path.join(base, '5000-big.json'), 'w') as fp:
+            json.dump({'BIG': items}, fp)
+
+    seed = {
+        '__name__': name,
+        '__file__': os.path.join(pkg, '__init__.py'),
+        '__path__': [base],
+        }
+
+    if scenario == 'zip':
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for top in dirs:
+                for fn in sorted(os.listdir(top)):
+                    arcname = os.path.relpath(os.path.join(top, fn), root)
+                    zf.write(os.path.join(top, fn), arcname)
+        shutil.rmtree(base)
+        for overlay in overlays:
+            shutil.rmtree(overlay)
+        seed['__path__'] = [os.path.join(archive, name, 'settings.d')]
+
+    return seed
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def best(fun, repeat):
+    times = list()
+    for _ in range(repeat):
+        start = timer()
+        fun()
+        times.append(timer() - start)
+    return min(times)
+
+
+def per_read(fun, keys, loops):
+    start = timer()
+    for _ in range(loops):
+        for key in keys:
+            fun(key)
+    elapsed = timer() - start
+    return elapsed / (loops * len(keys)) * 1e9
+
+
+def bench_scenario(root, opts, scenario):
+    name = 'settingsd_bench_{0}'.format(scenario)
+    os.makedirs(os.path.join(root, scenario))
+    seed = build_tree(os.path.join(root, scenario), name, opts, scenario)
+    sys.modules[name] = types.ModuleType(name)
+    sys.modules[name].__file__ = seed['__file__']
+    cache_dir = os.path.join(root, scenario, 'pycache')
+
+    def install():
+        return settingsd.install(
+            dict(seed, __path__=list(seed['__path__'])),
+            SETTINGSD_BYTECODE_CACHE=cache_dir,
+            )
+
+    def replace():
+        ns = dict(seed, __path__=list(seed['__path__']))
+        ns['__name__'] = name + '.settings'
+        ns['__package__'] = name
+        ns['__file__'] = os.path.join(os.path.dirname(seed['__file__']),
+                                      'settings.py')
+        return settingsd.replace(ns, SETTINGSD_BYTECODE_CACHE=cache_dir)
+
+    def cold_install():
+        finders.invalidate()
+        cache.clear()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return install()
+
+    results = dict()
+    results['install_cold'] = best(cold_install, opts.repeat)
+    results['install_warm'] = best(install, opts.repeat)
+    results['replace_warm'] = best(replace, opts.repeat)
+
+    settings = install()
+    ns = utils.namespace(settings)
+    paths = list(ns['__path__'])
+
+    def iter_parts_cold():
+        finders.invalidate()
+        return list(ns.iter_parts())
+
+    results['iter_parts_cold'] = best(iter_parts_cold, opts.repeat)
+    results['iter_parts_warm'] = best(lambda: list(ns.iter_parts()),
+                                      opts.repeat)
+
+    def find_all():
+        finders.invalidate()
+        for path in paths:
+            ns.find_parts(path)
+
+    results['find_parts_cold'] = best(find_all, opts.repeat)
+    results['parts'] = len(ns.part) - 1
+    results['paths'] = len(paths)
+
+    keys = [key for key in ns if key.isupper()][:opts.read_keys]
+    missing = ['MISSING_{0}'.format(i) for i in range(len(keys))]
+    results['keys'] = len([key for key in ns if key.isupper()])
+    results['read_getitem_ns'] = per_read(
+        settings.__getitem__, keys, opts.loops)
+    results['read_getattr_ns'] = per_read(
+        lambda key: getattr(settings, key), keys, opts.loops)
+    results['read_ns_miss_ns'] = per_read(
+        ns.__getitem__, missing, opts.loops)
+    frozen = settingsd.freeze(settings)
+    results['read_frozen_getattr_ns'] = per_read(
+        lambda key: getattr(frozen, key), keys, opts.loops)
+
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    if tracemalloc:
+        finders.invalidate()
+        cache.clear()
+        tracemalloc.start()
+        install()
+        results['install_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return results
+
+
+def run(opts):
+    root = tempfile.mkdtemp(prefix='settingsd-bench-')
+    try:
+        results = dict()
+        for scenario in opts.scenarios:
+            results[scenario] = bench_scenario(root, opts, scenario)
+            print('{0}: {1}'.format(scenario, json.dumps(
+                results[scenario], sort_keys=True)), file=sys.stderr)
+    finally:
+        finders.invalidate()
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'time': time.time(),
+            'options': dict(
+                (k, v) for k, v in vars(opts).items()
+                if k not in ('func', 'output')
+                ),
+            },
+        'results': results,
+        }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if opts.output:
+        with open(opts.output, 'w') as fp:
+            fp.write(data + '\n')
+    else:
+        print(data)
+
+
+def compare(opts):
+    with open(opts.before) as fp:
+        before = json.load(fp)['results']
+    with open(opts.after) as fp:
+        after = json.load(fp)['results']
+
+    regressed = False
+    fmt = '{0:<10} {1:<24} {2:>14} {3:>14} {4:>9}'
+    print(fmt.format('scenario', 'metric', 'before', 'after', 'change'))
+    for scenario in sorted(set(before) & set(after)):
+        for metric in sorted(set(before[scenario]) & set(after[scenario])):
+            a, b = before[scenario][metric], after[scenario][metric]
+            change = (b - a) / float(a) * 100 if a else 0.0
+            flag = ''
+            if metric in ('parts', 'paths', 'keys'):
+                flag = '' if a == b else ' !'
+            elif change > opts.threshold:
+                flag = ' *'
+                regressed = True
+            print(fmt.format(
+                scenario, metric, '{0:.6g}'.format(a), '{0:.6g}'.format(b),
+                '{0:+.1f}%'.format(change),
+                ) + flag)
+
+    if regressed:
+        print('* regressed by more than {0}%'.format(opts.threshold))
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    sub = parser.add_subparsers(dest='command')
+
+    parser_run = sub.add_parser('run', help='run benchmarks')
+    parser_run.add_argument('-o', '--output', help='write JSON here')
+    parser_run.add_argument('--scenarios', nargs='+', default=SCENARIOS,
+                            choices=SCENARIOS)
+    parser_run.add_argument('--fragments', type=int, default=200)
+    parser_run.add_argument('--paths', type=int, default=6,
+                            help='overlay paths added from a fragment')
+    parser_run.add_argument('--keys', type=int, default=8,
+                            help='keys per fragment')
+    parser_run.add_argument('--json-mb', type=int, default=4)
+    parser_run.add_argument('--repeat', type=int, default=5)
+    parser_run.add_argument('--loops', type=int, default=200)
+    parser_run.add_argument('--read-keys', type=int, default=500)
+    parser_run.set_defaults(func=run)
+
+    parser_cmp = sub.add_parser('compare', help='diff two result files')
+    parser_cmp.add_argument('before')
+    parser_cmp.add_argument('after')
+    parser_cmp.add_argument('--threshold', type=float, default=10.0,
+                            help='flag regressions above this percentage')
+    parser_cmp.set_defaults(func=compare)
+
+    opts = parser.parse_args(argv)
+    if not getattr(opts, 'func', None):
+        parser.print_help()
+        return 2
+    return opts.func(opts) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,7 +19,7 @@ from . import utils
 
 
 # PUBLIC API
-__all__ = ['install', 'replace']
+__all__ = ['install', 'replace', 'freeze', 'install_async', 'replace_async']
 
 
 def install(*args, **kwds):
@@ -38,3 +38,29 @@ def replace(*args, **kwds):
     ns = utils.ns_prepare(args + (kwds,), install=False)
     settings = utils.settings_from_ns(ns, update=True)
     return settings
+
+
+def install_async(*args, **kwds):
+    """
+    Coroutine; install(...) with scanning and reading off the event loop
+    """
+    from .aio import install_async
+    return install_async(*args, **kwds)
+
+
+def replace_async(*args, **kwds):
+    """
+    Coroutine; replace(...) with scanning and reading off the event loop
+    """
+    from .aio import replace_async
+    return replace_async(*args, **kwds)
+
+
+def freeze(settings):
+    """
+    Return an immutable copy of settings, detached from its namespace
+    """
+    from .base import FrozenSettings
+    if isinstance(settings, FrozenSettings):
+        return settings
+    return utils.namespace(settings).freeze()
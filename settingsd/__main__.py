@@ -0,0 +1,80 @@
+# encoding: utf8
+"""
+Command line tools
+
+    python -m settingsd bundle myapp -o myapp.bundle
+    python -m settingsd bundle myapp.settings --replace -o myapp.bundle \\
+        --set "__path__=['/etc/myapp/settings.d']"
+
+bundle assembles settings like install(...) (or replace(...)) would, with
+--set seeding the namespace like keywords to install(...), and packs every
+loaded part into one file for SETTINGSD_BUNDLE.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import ast
+import importlib
+import sys
+
+from . import base
+from . import bundle
+from . import utils
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m settingsd',
+        description=__doc__.strip().split('\n')[0],
+        )
+    sub = parser.add_subparsers(dest='command')
+
+    parser_bundle = sub.add_parser('bundle', help='pack parts into a bundle')
+    parser_bundle.add_argument('module', help='package (or settings module)')
+    parser_bundle.add_argument('-o', '--output', required=True)
+    parser_bundle.add_argument('--replace', action='store_true',
+                               help='module calls replace(...), not install')
+    parser_bundle.add_argument('--set', action='append', default=[],
+                               metavar='KEY=VALUE',
+                               help='seed the namespace (Python literals)')
+    parser_bundle.set_defaults(func=build_bundle)
+
+    opts = parser.parse_args(argv)
+    if not getattr(opts, 'func', None):
+        parser.print_help()
+        return 2
+    return opts.func(opts) or 0
+
+
+def build_bundle(opts):
+    sys.path.insert(0, '')
+    module = importlib.import_module(opts.module)
+    seed = {
+        '__name__': module.__name__,
+        '__file__': getattr(module, '__file__', None),
+        '__package__': getattr(module, '__package__', None),
+        }
+    for item in opts.set:
+        key, _, value = item.partition('=')
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        seed[key.strip()] = value
+
+    ns = utils.ns_prepare([seed], install=not opts.replace)
+    settings_ns = base.Settingsd(ns)
+    try:
+        count = bundle.build(settings_ns, opts.output)
+    except (IOError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print('{0}: {1} parts from {2} paths'.format(
+        opts.output, count, len(settings_ns.scanned),
+        ), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
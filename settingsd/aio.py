@@ -0,0 +1,77 @@
+# encoding: utf8
+"""
+asyncio install API
+
+install_async(...) and replace_async(...) assemble exactly like install(...)
+and replace(...), but scan paths and read (and compile) parts in the loop's
+default executor. Parts still execute in order on the loop thread, so
+independent settings packages can assemble concurrently:
+
+    >>> settings = await settingsd.install_async(__name__)
+
+Python 3.5+ only; settingsd.install_async imports this module lazily.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import asyncio
+
+from . import base
+from . import prefetch
+from . import utils
+
+
+async def install_async(*args, **kwds):
+    """
+    Install settings into another module, without blocking the event loop
+    """
+    ns = utils.ns_prepare(args + (kwds,), install=True)
+    settings_ns = await assemble(ns)
+    return utils.settings_from_ns(settings_ns, update=True)
+
+
+async def replace_async(*args, **kwds):
+    """
+    Replace module with settings, without blocking the event loop
+    """
+    ns = utils.ns_prepare(args + (kwds,), install=False)
+    settings_ns = await assemble(ns)
+    return utils.settings_from_ns(settings_ns, update=True)
+
+
+async def assemble(ns):
+    """
+    Return a Settingsd assembled from ns with I/O off the event loop
+    """
+    loop = asyncio.get_event_loop()
+    settings_ns = base.Settingsd.__new__(base.Settingsd)
+    settings_ns.prepare(ns)
+    for kind, arg in settings_ns.assemble():
+        if kind == 'paths':
+            for path in arg:
+                if path in settings_ns.listed:
+                    continue
+                try:
+                    parts = await loop.run_in_executor(
+                        None, settings_ns.find_parts, path,
+                        )
+                except Exception:
+                    # scan again, on the loop, so it fails in order
+                    continue
+                settings_ns.listed[path] = parts
+
+        elif kind == 'part':
+            planned = prefetch.plan(settings_ns, arg)
+            if planned is None:
+                continue
+            try:
+                data, code = await loop.run_in_executor(
+                    None, prefetch.fetch, arg['get_data'], arg, *planned
+                    )
+            except Exception:
+                # load again, on the loop, so it fails in order
+                continue
+            prefetch.hand(arg, data, code)
+
+    return settings_ns
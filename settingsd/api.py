@@ -10,9 +10,10 @@ from __future__ import print_function
 import sys
 
 from . import utils
+from .profiling import PHASES
 
 
-__all__ = ['trace', 'source', 'show']
+__all__ = ['trace', 'source', 'show', 'profile', 'stats', 'skipped']
 
 
 def trace(self, key=None):
@@ -34,6 +35,49 @@ def source(self, key=None):
     return tuple(ns.path.items())
 
 
+def skipped(self):
+    ns = utils.namespace(self)
+    return tuple(
+        (name, keys['tags'])
+        for name, keys in getattr(ns, 'guarded', dict()).items()
+        )
+
+
+def profile(self, part=None):
+    ns = utils.namespace(self)
+    profiler = getattr(ns, 'profiler', None)
+    if profiler is None:
+        return part is None and dict() or None
+    if part is not None:
+        return profiler.parts.get(part)
+    return {
+        'parts': tuple(profiler.parts.items()),
+        'paths': tuple(profiler.paths.items()),
+        'stages': tuple(profiler.stages.items()),
+        }
+
+
+def stats(self, key=None):
+    ns = utils.namespace(self)
+    counter = getattr(ns, 'counter', None)
+    reads = counter and counter.reads() or dict()
+    if key is not None:
+        return reads.get(key.upper(), 0)
+
+    keys = [key for key in ns.dist if not key.startswith('SETTINGSD_')]
+    keys.extend(key for key in reads if key not in ns.dist)
+    counted = sorted(
+        ((key, reads.get(key, 0)) for key in keys),
+        key=lambda item: -item[1],
+        )
+    sites = counter and counter.sites() or dict()
+    return {
+        'reads': tuple(item for item in counted if item[1]),
+        'unread': tuple(key for key, n in counted if not n),
+        'sites': tuple(sorted(sites.items(), key=lambda item: -item[1])),
+        }
+
+
 def show(self, prefix='[settings.d]', file=None):
     ns = utils.namespace(self)
     pfx = prefix and (str(prefix) + ' ') or ''
@@ -67,3 +111,59 @@ def show(self, prefix='[settings.d]', file=None):
     for joins, key in joined:
         out = pfx + '    {0:.<{1}} {2}'.format(key, maxlen, joins)
         print(out, file=fp)
+
+    # dump SKIPPED fragments, with the guards that failed
+    guarded = ns.skipped()
+    if guarded:
+        print(pfx + 'SKIPPED:', file=fp)
+        maxlen = min(40, max(len(name) + 1 for name, _ in guarded))
+        for name, tags in guarded:
+            out = pfx + '    {0:.<{1}} @{2}'.format(
+                name + ' ', maxlen, '@'.join(tags),
+                )
+            print(out, file=fp)
+
+    # dump PROFILE by PART, if profiled
+    profiled = ns.profile()
+    if profiled:
+        print(pfx + 'PROFILE:', file=fp)
+        rows = [(path, '{0:.6f}s'.format(secs))
+                for path, secs in profiled['paths']]
+        rows.extend((name, '{0:.6f}s'.format(secs))
+                    for name, secs in profiled['stages'])
+        for name, record in profiled['parts']:
+            phases = ' | '.join(
+                '{0} {1:.6f}s'.format(phase, record[phase])
+                for phase in PHASES
+                )
+            if record['alloc'] is not None:
+                phases += ' | alloc {0}B'.format(record['alloc'])
+            rows.append((name, phases))
+        maxlen = min(40, max([len(name) + 1 for name, _ in rows] or [40]))
+        for name, out in rows:
+            print(pfx + '    {0:.<{1}} {2}'.format(name + ' ', maxlen, out),
+                  file=fp)
+
+    # dump READS by KEY, if counted
+    if getattr(ns, 'counter', None) is None:
+        return
+
+    counted = ns.stats()
+    print(pfx + 'READS:', file=fp)
+    maxlen = [len(key) + 1 for key, _ in counted['reads']]
+    maxlen = min(40, max(maxlen or [40]))
+    for key, n in counted['reads']:
+        out = pfx + '    {0:.<{1}} {2} | {3}'.format(
+            key + ' ', maxlen, n, ' | '.join(ns.trace(key)),
+            )
+        print(out, file=fp)
+
+    print(pfx + 'UNREAD:', file=fp)
+    for key in counted['unread']:
+        out = pfx + '    {0} | {1}'.format(key, ' | '.join(ns.trace(key)))
+        print(out, file=fp)
+
+    print(pfx + 'SITES:', file=fp)
+    for (key, filename, lineno), n in counted['sites'][:20]:
+        out = pfx + '    {0} {1}:{2} {3}'.format(n, filename, lineno, key)
+        print(out, file=fp)
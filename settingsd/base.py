@@ -8,11 +8,15 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import collections
+import heapq
+import itertools
 import os.path
 import types
 
 from . import defaults
+from . import profiling
 from . import utils
+from .provenance import Provenance
 
 
 class Namespace(object):
@@ -27,28 +31,87 @@ class BaseSettings(object):
     Default implementation of SETTINGSD_BASES
     """
 
+    # subclasses get a __dict__ unless they also declare __slots__
+    __slots__ = ()
+
+    # ContextVar of context-local overrides, see override(...)
+    SETTINGSD_OVERLAY = None
+
     def __repr__(self):
         rv = '<module {0.__name__!r} from {0.__file__!r}>'.format(self)
         return rv
 
     def __contains__(self, key):
-        rv = key in utils.namespace(self)
+        rv = key in _overlay(self) or key in utils.namespace(self)
         return rv
 
     def __getitem__(self, key):
-        rv = utils.namespace(self)[key]
+        rv = _overridden(self, key)
+        if rv is utils.MISSING:
+            rv = utils.namespace(self)[key]
         return rv
 
     def __iter__(self):
         #FIXME: should this only consider isupper() keys?
-        rv = iter(utils.namespace(self))
+        ns = utils.namespace(self)
+        rv = itertools.chain(ns, _only_overridden(self, ns))
         return rv
 
     def __len__(self):
         #FIXME: should this only consider isupper() keys?
-        rv = len(utils.namespace(self))
+        ns = utils.namespace(self)
+        rv = len(ns) + len(_only_overridden(self, ns))
+        return rv
+
+    def override(self, **keys):
+        """
+        Override keys in the current context; a context manager or decorator
+
+        See settingsd.overlay; requires contextvars (Python 3.7+).
+        """
+        from .overlay import Override
+        return Override(self, keys)
+
+
+class FrozenSettings(BaseSettings):
+    """
+    Immutable settings detached from the namespace that assembled them
+
+    Every key is a class attribute, so reads are a single attribute lookup.
+    SETTINGSD_MAPPING is a read-only view of the namespace and SETTINGSD_KEYS
+    the tuple of uppercase keys. Keys cannot be rebound, but values are
+    shared as-is and may still be mutable.
+    """
+
+    __slots__ = ()
+
+    SETTINGSD_NS = 'SETTINGSD_MAPPING'
+    SETTINGSD_MAPPING = utils.MappingProxyType(dict())
+    SETTINGSD_KEYS = ()
+
+    def __contains__(self, key):
+        return key in _overlay(self) or key in self.SETTINGSD_MAPPING
+
+    def __getitem__(self, key):
+        rv = _overridden(self, key)
+        if rv is utils.MISSING:
+            rv = self.SETTINGSD_MAPPING[key]
         return rv
 
+    def __iter__(self):
+        mapping = self.SETTINGSD_MAPPING
+        return itertools.chain(mapping, _only_overridden(self, mapping))
+
+    def __len__(self):
+        mapping = self.SETTINGSD_MAPPING
+        return len(mapping) + len(_only_overridden(self, mapping))
+
+    def __setattr__(self, key, attr):
+        raise AttributeError("can't set attribute")
+
+    def __delattr__(self, key):
+        raise AttributeError("can't delete attribute")
+
 
 class Settingsd(Namespace, collections.OrderedDict):
 
@@ -56,39 +119,77 @@ class Settingsd(Namespace, collections.OrderedDict):
     from .api import show
     from .api import source
     from .api import trace
+    from .api import profile
+    from .api import stats
+    from .api import skipped
+
+    # incremental.Tracker records of the assembly being reassembled
+    previous = None
 
     def __init__(self, *args, **kwds):
+        self.prepare(*args, **kwds)
+        self.__import__()
+
+    def prepare(self, *args, **kwds):
+        """
+        Initialize the seeded namespace without assembling it
+        """
         # use a temp OrderedDict to initialize the first part
         ns = collections.OrderedDict(*args, **kwds)
+        # keep the untouched seed around for reassembly
+        self.seed = collections.OrderedDict(ns)
+        self.seed['__path__'] = list(ns.get('__path__', ()))
         part = types.ModuleType(ns['__name__'])
         part.__dict__.update(ns)
         self.part = [part]
-        self.dist = collections.OrderedDict()
-        self.path = collections.OrderedDict()
+        self.provenance = Provenance()
+        self.provenance.enter(
+            part.__name__.rsplit('.', 1)[-1],
+            # ns_prepare leaves __file__ None for seeds without one
+            os.path.dirname(part.__file__ or ''),
+            )
+        self.scanned = collections.OrderedDict()
+        # parts skipped by guard tags: name -> keys
+        self.guarded = collections.OrderedDict()
         self.type_overrides = dict()
+        self.records = None
+        self.tracker = None
+        self.resolved = dict()
+        self.profiler = None
+        self.counter = None
+        # parts found ahead of time by an assembly driver (see aio.py)
+        self.listed = dict()
+        # URIs of parts dropped by prune(), eg. for bundle.build
+        self.pruned = ()
+        # bumped by every change; see instance
+        self.generation = 0
+        self.touched = None
+        self.cached = None
         super(Settingsd, self).__init__(ns)
-        self.__import__()
 
     def __getitem__(self, key):
-        try:
-            # pass super(...) object because getopt will try to self[key]
-            supr = super(Settingsd, self)
-            item = utils.getopt(
-                supr, key,
-                strict=not key.isupper(),
-                copy=True,
-                )
-        except AttributeError as e:
-            if '__builtins__' in self and key in self['__builtins__']:
+        if self.tracker is not None:
+            self.tracker.read(key)
+
+        if dict.__contains__(self, key):
+            return dict.__getitem__(self, key)
+
+        default = utils.getdefault(key)
+        if default is utils.MISSING:
+            if key.isupper():
+                # NameErrors transformed into None
+                return None
+
+            builtins = dict.get(self, '__builtins__')
+            if builtins is not None and key in builtins:
                 # Python 2.x seems to do this for us
-                return self['__builtins__'][key]
+                return builtins[key]
             raise KeyError(key)
 
-        # FIXME: if we dont self[key] = item, users are unable to override
-        # SETTINGSD_* config, even though we just copied it :(
-        # should we do this for all keys, SETTINGSD_* keys, or expect the
-        # user to do it manually?
-        if key.startswith('SETTINGSD_'):
+        item = utils.getdefault(key, copy=True)
+        if item is not default:
+            # a mutable default may be changed in place (eg. appending to
+            # SETTINGSD_FINDERS); copy it once and keep it in the namespace
             self[key] = item
         return item
 
@@ -98,25 +199,131 @@ class Settingsd(Namespace, collections.OrderedDict):
             self.part[-1].__doc__ = attr and attr.strip()
             return
 
+        if self.tracker is not None:
+            self.tracker.write(self, key, attr)
+
         supr = super(Settingsd, self)
-        if key.isupper() and not key[0].isdigit() and (
-                key not in self or attr is not self.get(key)
-                ):
+        changed = (
+            not dict.__contains__(self, key) or
+            attr is not dict.get(self, key)
+            )
+        if changed:
+            self.touch(key)
+        if changed and key.isupper() and not key[0].isdigit():
             # record this SETTINGS_KEY
-            part = self.part[-1]
-            partname = part.__name__.rsplit('.', 1)[-1]
-            partpath = os.path.dirname(part.__file__)
-            if key not in self.dist:
-                self.dist[key] = list()
-            if partpath not in self.path:
-                self.path[partpath] = list()
-            self.dist[key].append(partname)
-            self.path[partpath].append(key)
-            setattr(part, key, attr)
+            if self.provenance is not None:
+                self.provenance.record(key)
+            setattr(self.part[-1], key, attr)
+            if self.tracker is not None:
+                self.tracker.provenance(key)
         supr.__setitem__(key, attr)
 
+    def __delitem__(self, key):
+        self.touch(key)
+        super(Settingsd, self).__delitem__(key)
+
+    # fragments may also read via globals().get(...) or `key in globals()`
+
+    def __contains__(self, key):
+        if self.tracker is not None:
+            self.tracker.read(key)
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        if self.tracker is not None:
+            self.tracker.read(key)
+        return dict.get(self, key, default)
+
+    # the C OrderedDict implements these without __setitem__/__delitem__
+
+    def pop(self, key, *default):
+        if dict.__contains__(self, key):
+            self.touch(key)
+        return super(Settingsd, self).pop(key, *default)
+
+    def popitem(self, last=True):
+        key, attr = super(Settingsd, self).popitem(last)
+        self.touch(key)
+        return key, attr
+
+    def clear(self):
+        self.touch()
+        super(Settingsd, self).clear()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def touch(self, key=None):
+        """
+        Mark key, or everything, changed since instance was last built
+        """
+        self.generation += 1
+        if key is None or self.touched is None:
+            self.touched = None
+        else:
+            self.touched.add(key)
+
+    @property
+    def dist(self):
+        """
+        SETTINGS_KEY -> names of the parts that wrote it, in order
+        """
+        if self.provenance is None:
+            return collections.OrderedDict()
+        return self.provenance.dist
+
+    @property
+    def path(self):
+        """
+        Part directory -> SETTINGS_KEYs written by parts within, in order
+        """
+        if self.provenance is None:
+            return collections.OrderedDict()
+        return self.provenance.path
+
     @property
     def instance(self):
+        """
+        The settings object, cached until the namespace changes
+
+        Changes to plain keys are applied to the existing class in place;
+        changes to special names, SETTINGSD_BASES, SETTINGSD_NS or
+        SETTINGSD_STATS build a new class and object. Frozen settings are
+        always built anew.
+        """
+        cached = self.cached
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+
+        if utils.getopt(self, 'SETTINGSD_FROZEN'):
+            # freeze(...) calls ready(...) itself
+            settings = self.freeze()
+            self.touched = set()
+            self.cached = (self.generation, settings)
+            return settings
+
+        with profiling.stage(self, 'instance'):
+            touched = self.touched
+            if cached is not None and touched is not None and not any(
+                    key in _REBUILD or key.startswith('__')
+                    for key in touched
+                    ) and not isinstance(cached[1], FrozenSettings):
+                settings = cached[1]
+                _update_class(self, settings.__class__, touched)
+            else:
+                settings = self.build()
+            self.touched = set()
+            self.cached = (self.generation, settings)
+            self.ready(settings)
+
+        return settings
+
+    def build(self):
+        """
+        Return a new settings object of a new class built from scratch
+        """
         # derive a name for our custom subclass
         name = self['__name__'].replace('.', ' ').title().replace(' ', '')
         key = utils.getopt(self, 'SETTINGSD_NS')
@@ -129,99 +336,337 @@ class Settingsd(Namespace, collections.OrderedDict):
         # functions in __dict__ shadow those in __class__
         attrs = _find_and_proxy_methods(attrs)
         # construct said subclass and instantiate
-        #FIXME: should class and/or instance be cached?
         settings = type(name, bases, attrs)
         settings.__module__ = self['__package__']
+        rate = utils.getopt(self, 'SETTINGSD_STATS')
+        if rate:
+            from . import stats
+            if self.counter is None:
+                self.counter = stats.Counter(rate)
+            stats.instrument(settings, self.counter)
         settings = settings()
         if key:
             #FIXME: would Falsey lead to GC self???
             setattr(settings, key, self)
 
-        # if user defined ready(...), call it now
-        if hasattr(settings, 'ready'):
-            if hasattr(settings.ready, '__call__'):
-                settings.ready()
+        return settings
+
+    def freeze(self):
+        """
+        Return an immutable FrozenSettings instance of this namespace
+        """
+        name = self['__name__'].replace('.', ' ').title().replace(' ', '')
+        bases = utils.getopt(self, 'SETTINGSD_BASES')
+        bases = (FrozenSettings,) + utils.resolve_bases(self, bases)
+        mapping = collections.OrderedDict(self)
+        mapping.pop('__builtins__', None)
+        attrs = dict(mapping, **self.type_overrides)
+        attrs.pop('SETTINGSD_NS', None)
+        attrs.update(
+            __slots__=(),
+            SETTINGSD_MAPPING=utils.MappingProxyType(mapping),
+            SETTINGSD_KEYS=tuple(key for key in mapping if key.isupper()),
+            )
+        with profiling.stage(self, 'instance'):
+            settings = type(name, bases, attrs)
+            settings.__module__ = self['__package__']
+            settings = settings()
+            self.ready(settings)
 
         return settings
 
+    def ready(self, settings):
+        """
+        Call ready(...) if defined by the user
+        """
+        if hasattr(settings, 'ready'):
+            if hasattr(settings.ready, '__call__'):
+                with profiling.stage(self, 'ready'):
+                    settings.ready()
+
     def __import__(self):
+        for hint in self.assemble():
+            # nothing to do ahead of time; parts are read as needed
+            pass
+
+    def assemble(self):
+        """
+        Assemble the namespace, yielding hints about upcoming I/O
+
+        A driver may act on each hint before resuming: ('paths', paths)
+        before those paths are scanned, to store parts found on them in
+        self.listed, or ('part', info) before info is loaded, to read it (see
+        prefetch.hand). Results are identical either way.
+        """
+        from . import snapshot
+
+        if not utils.getopt(self, 'SETTINGSD_PROVENANCE'):
+            self.provenance = None
+
+        profile = utils.getopt(self, 'SETTINGSD_PROFILE')
+        if profile:
+            self.profiler = profiling.Profiler(memory=profile == 'memory')
+
+        # skip assembly entirely if an identical one was snapshotted
+        digest = snapshot.seed(self)
+        if digest is not None:
+            with profiling.stage(self, 'snapshot'):
+                if snapshot.restore(self, digest):
+                    return
+
+        # or attach to one shared by the process that assembled first
+        shared = snapshot.seed(self, 'SETTINGSD_SHARED')
+        if shared is not None:
+            with profiling.stage(self, 'shared'):
+                if snapshot.attach(self, shared):
+                    return
+
         # save original value
         file_orig = self['__file__']
 
-        for info in self.iter_parts():
+        if utils.getopt(self, 'SETTINGSD_INCREMENTAL'):
+            from .incremental import Tracker
+            self.tracker = Tracker(self.previous)
+        self.previous = None
+
+        parts = self.iter_parts()
+        while True:
+            yield ('paths', [
+                path for path in self['__path__'] if path not in self.scanned
+                ])
+            info = next(parts, None)
+            if info is None:
+                break
+
+            yield ('part', info)
             name = self['__name__'] + '.' + info['name']
             part = self[info['name']] = types.ModuleType(name)
             self.part.append(part)
             self['__file__'] = part.__file__ = info['uri']
+            if self.provenance is not None:
+                self.provenance.enter(
+                    info['name'], os.path.dirname(info['uri']),
+                    )
 
-            # search each loader in order until a match is found
-            loader = None
-            for loader in utils.getopt(self, 'SETTINGSD_LOADERS'):
-                loader = utils.resolve_import(self, loader)(self, info)
-                if loader:
-                    # loader could be a simple function, such as executing
-                    # python code in our namespace, but the loader might also
-                    # be a descriptor designed to handle a single key
-                    if hasattr(loader, '__get__'):
-                        self.type_overrides[info['key']] = loader
-                        self[info['key']] = info['uri']
-                    # loader found and done processing part
-                    break
+            with profiling.part(self, info):
+                if self.tracker is None:
+                    self.load_part(info)
+                    continue
+
+                record = self.tracker.replayable(info)
+                if record is not None:
+                    # unchanged and independent of anything changed
+                    self.tracker.replay(self, info, part, record)
+                    continue
+
+                self.tracker.begin(info)
+                self.load_part(info)
+                self.tracker.end(self, info, part)
+
+        if self.profiler is not None:
+            self.profiler.close()
 
-            if not loader:
-                # unable to find a specialty loader; store the path
-                self[info['key']] = info['uri']
+        if self.tracker is not None:
+            self.records = self.tracker.records
+            self.tracker = None
 
         # restore original value
         self['__file__'] = file_orig
         #TODO: useful?
         #self.pop('__import__')
 
+        if not utils.getopt(self, 'SETTINGSD_PROVENANCE'):
+            self.provenance = None
+        if utils.getopt(self, 'SETTINGSD_PRUNE_PARTS'):
+            self.prune()
+
+        snapshot.save(self, digest)
+        if shared is not None:
+            snapshot.share(self)
+
+    def prune(self):
+        """
+        Drop part modules once assembled; trace() and source() still work
+        """
+        parts = set(id(part) for part in self.part[1:])
+        self.pruned += tuple(part.__file__ for part in self.part[1:])
+        del self.part[1:]
+        for key, attr in list(self.items()):
+            if id(attr) in parts:
+                self.touch(key)
+                collections.OrderedDict.__delitem__(self, key)
+
+        if self.provenance is not None:
+            part = self.part[0]
+            self.provenance.enter(
+                part.__name__.rsplit('.', 1)[-1],
+                os.path.dirname(part.__file__ or ''),
+                )
+
+    def load_part(self, info):
+        """
+        Load a part with the first SETTINGSD_LOADERS to accept it
+        """
+        # search each loader in order until a match is found
+        loader = None
+        for loader in self.resolve_opt('SETTINGSD_LOADERS'):
+            loader = loader(self, info)
+            if loader:
+                # loader could be a simple function, such as executing
+                # python code in our namespace, but the loader might also
+                # be a descriptor designed to handle a single key
+                if hasattr(loader, '__get__'):
+                    self.type_overrides[info['key']] = loader
+                    self[info['key']] = info['uri']
+                # loader found and done processing part
+                break
+
+        if not loader:
+            # unable to find a specialty loader; store the path
+            self[info['key']] = info['uri']
+
+    def reassemble(self):
+        """
+        Return a new Settingsd assembled from the same seed
+
+        With SETTINGSD_INCREMENTAL, only parts changed since this assembly,
+        and parts reading keys written by those, are executed again.
+        """
+        from . import finders
+
+        # in-place edits don't change directory listings
+        for path in self.scanned:
+            finders.invalidate(path)
+
+        ns = collections.OrderedDict(self.seed)
+        ns['__path__'] = list(self.seed['__path__'])
+        settings = self.__class__.__new__(self.__class__)
+        settings.previous = self.records
+        settings.__init__(ns)
+        return settings
+
+    def find_parts(self, path):
+        """
+        Return parts found by the first SETTINGSD_FINDERS to handle path
+        """
+        if path in self.listed:
+            return self.listed.pop(path)
+
+        parts = None
+        with profiling.path(self, path):
+            for finder in self.resolve_opt('SETTINGSD_FINDERS'):
+                parts = finder(self, path)
+                if parts not in (None, False):
+                    break
+
+        return parts
+
+    def resolve_opt(self, opt, datum=None):
+        """
+        Return SETTINGSD_* opt with import strings resolved to objects
+
+        Lists (SETTINGSD_FINDERS, SETTINGSD_LOADERS) resolve to tuples; with
+        datum, the entry for datum in a registry (SETTINGSD_LOADER_FROM_EXT,
+        etc) is resolved instead. Results are cached for as long as the
+        option, which fragments may also edit in place, holds the same items.
+        """
+        raw = utils.getopt(self, opt)
+        if datum is None:
+            raw = tuple(raw)
+        else:
+            raw = raw.get(datum)
+
+        cache_key = (opt, datum)
+        cached = self.resolved.get(cache_key)
+        if cached is not None and utils.equal(cached[0], raw):
+            return cached[1]
+
+        if datum is None:
+            value = tuple(utils.resolve_import(self, item) for item in raw)
+        else:
+            value = raw and utils.resolve_import(self, raw)
+
+        self.resolved[cache_key] = (raw, value)
+        return value
+
     def iter_parts(self):
         """
         similar to pkgutil.iter_modules, but allows path to change/update
+
+        Parts are yielded in (index, name) order; the first path providing a
+        given (index, name) wins. Each path is scanned once, so a fragment
+        extending __path__ only costs a scan of the new paths. With
+        SETTINGSD_PREFETCH, upcoming parts are read while earlier ones run.
+        Parts whose guard tags (50-cache@prod.py) do not match SETTINGSD_TAGS
+        when their turn comes are recorded in self.guarded instead.
         """
-        def regen(paths, cache_in, cache_out):
+        def regen(paths, queue, found):
             for path in paths:
-                parts = None
-                for finder in utils.getopt(self, 'SETTINGSD_FINDERS'):
-                    parts = utils.resolve_import(self, finder)(self, path)
-                    if parts not in (None, False):
-                        break
+                if path in self.scanned:
+                    continue
 
+                parts = self.scanned[path] = self.find_parts(path)
                 if not parts:
                     continue
 
                 for part in parts:
-                    keys = utils.keys_from_uri(part['uri'])
-                    if not keys:
-                        continue
+                    if 'index' in part:
+                        # finder already derived the keys (bundle, etc)
+                        keys = dict(part)
+                    else:
+                        keys = utils.keys_from_uri(part['uri'])
+                        if not keys:
+                            continue
+                        keys.update(part)
 
-                    keys.update(part)
                     cache_key = (keys['index'], keys['name'])
-                    if cache_key not in cache_out:
-                        if cache_key not in cache_in:
-                            cache_in[cache_key] = keys
+                    if cache_key not in found:
+                        found[cache_key] = keys
+                        heapq.heappush(queue, cache_key)
+
+        def ahead(found, upcoming):
+            # keep the next few pending parts in flight
+            for cache_key in upcoming[:prefetcher.window]:
+                prefetcher.submit(cache_key, found[cache_key])
+
+        # (index, name) heap of pending parts, and all parts pending or done
+        queue, found = list(), dict()
+        self.scanned.clear()
+        self.guarded.clear()
+        old_path = self['__path__'][:]
+        regen(old_path, queue, found)
 
-            return cache_in, cache_out
+        from .prefetch import Prefetcher
+        prefetcher = Prefetcher.create(self)
+        upcoming = prefetcher and sorted(queue)
 
-        old_path = self['__path__'][:]
-        cache_in, cache_out = regen(self['__path__'], dict(), dict())
-
-        while cache_in:
-            # probably inefficient...
-            key = sorted(cache_in)[0]
-            val = cache_out[key] = cache_in.pop(key)
-            yield val
-
-            # a block of code was executed, maybe regen cache
-            if self['__path__'] != old_path:
-                old_path = self['__path__'][:]
-                cache_in, cache_out = regen(
-                    self['__path__'],
-                    cache_in,
-                    cache_out,
-                    )
+        try:
+            while queue:
+                cache_key = heapq.heappop(queue)
+                keys = found[cache_key]
+                if not utils.tags_match(self, keys.get('tags')):
+                    # guarded; never read, let alone executed
+                    self.guarded[keys['name']] = keys
+                    if prefetcher:
+                        del upcoming[0]
+                    continue
+
+                if prefetcher:
+                    # pending parts pop in order; upcoming[0] is this one
+                    del upcoming[0]
+                    ahead(found, upcoming)
+                    prefetcher.take(cache_key, found[cache_key])
+                yield found[cache_key]
+
+                # a block of code was executed, maybe scan new paths
+                if self['__path__'] != old_path:
+                    old_path = self['__path__'][:]
+                    regen(old_path, queue, found)
+                    upcoming = prefetcher and sorted(queue)
+        finally:
+            if prefetcher:
+                # discard anything read for parts never yielded
+                prefetcher.close()
 
 
 class MethodFromDictFunction(object):
@@ -243,6 +688,112 @@ class MethodFromDictFunction(object):
         raise AttributeError("can't set attribute")
 
 
+class OverriddenKey(object):
+    """
+    Data descriptor reading a key from the context-local overlay first
+
+    Installed on the settings class the first time key is overridden (see
+    settingsd.overlay); otherwise the key reads as it would without it.
+    """
+
+    def __init__(self, key, overlay, shadowed):
+        self.key = key
+        self.overlay = overlay
+        self.shadowed = shadowed
+
+    def __get__(self, settings, owner):
+        if settings is None:
+            return self
+
+        overlay = self.overlay.get()
+        if overlay and self.key in overlay:
+            return overlay[self.key]
+
+        # as if we were not here: data descriptors, __dict__, class attrs
+        attr = self.shadowed
+        if hasattr(attr, '__set__') or hasattr(attr, '__delete__'):
+            return attr.__get__(settings, owner)
+        data = getattr(settings, '__dict__', None)
+        if data is not None and dict.__contains__(data, self.key):
+            return dict.__getitem__(data, self.key)
+        if attr is utils.MISSING:
+            raise AttributeError(self.key)
+        if hasattr(attr, '__get__'):
+            return attr.__get__(settings, owner)
+        return attr
+
+    def __set__(self, settings, attr):
+        if hasattr(self.shadowed, '__set__'):
+            return self.shadowed.__set__(settings, attr)
+
+        data = getattr(settings, '__dict__', None)
+        if data is None:
+            raise AttributeError("can't set attribute")
+        dict.__setitem__(data, self.key, attr)
+
+    def __delete__(self, settings):
+        if hasattr(self.shadowed, '__delete__'):
+            return self.shadowed.__delete__(settings)
+
+        data = getattr(settings, '__dict__', None)
+        if data is None or not dict.__contains__(data, self.key):
+            raise AttributeError(self.key)
+        dict.__delitem__(data, self.key)
+
+
+# the overlay outside of any override(...)
+_NO_OVERLAY = utils.MappingProxyType(dict())
+
+
+def _overlay(settings):
+    """
+    Return the keys overridden in the current context, if any
+    """
+    overlay = settings.SETTINGSD_OVERLAY
+    if overlay is not None:
+        overlay = overlay.get()
+    return overlay or _NO_OVERLAY
+
+
+def _overridden(settings, key):
+    overlay = _overlay(settings)
+    if key in overlay:
+        return overlay[key]
+    return utils.MISSING
+
+
+def _only_overridden(settings, mapping):
+    """
+    Return the keys overridden in the current context but not in mapping
+    """
+    return [key for key in _overlay(settings) if key not in mapping]
+
+
+# keys that cannot be updated on an existing class
+_REBUILD = frozenset(('SETTINGSD_BASES', 'SETTINGSD_NS', 'SETTINGSD_STATS'))
+
+
+def _update_class(settings_ns, cls, keys):
+    for key in keys:
+        if key in settings_ns.type_overrides:
+            attr = settings_ns.type_overrides[key]
+        elif dict.__contains__(settings_ns, key):
+            attr = dict.__getitem__(settings_ns, key)
+        else:
+            attr = utils.MISSING
+
+        if attr is not utils.MISSING:
+            attr = _find_and_proxy_methods({key: attr})[key]
+        current = vars(cls).get(key)
+        if isinstance(current, OverriddenKey):
+            # still overridable; only what it falls back to changed
+            current.shadowed = attr
+        elif attr is not utils.MISSING:
+            setattr(cls, key, attr)
+        elif key in vars(cls):
+            delattr(cls, key)
+
+
 def _find_and_proxy_methods(attrs):
     for fun_name, fun in attrs.items():
         if fun_name.startswith('__') and fun_name.endswith('__'):
@@ -0,0 +1,192 @@
+# encoding: utf8
+"""
+Settings bundles
+
+A bundle packs every part an assembly loaded into one file, grouped by the
+path each was found on:
+
+    python -m settingsd bundle myapp -o /etc/myapp/settings.bundle
+
+With SETTINGSD_BUNDLE pointing at it, finders.bundle answers for every path
+scanned when the bundle was built, so __path__ (and fragments changing it)
+behave exactly as before, but without walking directories, matching names
+or compiling. Python parts are stored as marshalled code, JSON parts as
+marshalled data and anything else as-is; the file is memory mapped and
+entries are sliced out of it without copying.
+
+Layout: MAGIC, the header length (4 bytes, little endian), the marshalled
+header, then entry payloads. Bundles built by another Python are ignored.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import functools
+import marshal
+import mmap
+import struct
+
+from . import cache
+from . import loaders
+from . import utils
+
+
+MAGIC = b'settingsd-bundle\n'
+
+# bump when the layout of the bundle changes
+VERSION = 2
+
+HEADER = struct.Struct('<I')
+
+# entry payloads
+CODE, DATA, TEXT, BYTES, DIR = 'code', 'data', 'text', 'bytes', 'dir'
+
+
+def build(settings, path):
+    """
+    Write a bundle of every part loaded by settings; return the entry count
+    """
+    ns = utils.namespace(settings)
+    loaded = set(part.__file__ for part in ns.part[1:])
+    # SETTINGSD_PRUNE_PARTS drops the part modules, not what they were
+    loaded.update(ns.pruned)
+    # guarded parts are packed too; SETTINGSD_TAGS decides when loading
+    loaded.update(keys['uri'] for keys in ns.guarded.values())
+
+    paths = list()
+    payloads = list()
+    offset = 0
+    for scan_path, parts in ns.scanned.items():
+        entries = list()
+        for part in parts or ():
+            if part['uri'] not in loaded:
+                # shadowed by a part found earlier
+                continue
+
+            keys = utils.keys_from_uri(part['uri'])
+            keys.update(part)
+            kind, payload = _payload(ns, keys)
+            entries.append((
+                keys['uri'], keys['head'], keys['tail'], keys['name'],
+                keys['ext'], keys['index'], keys['key'], keys['tags'],
+                keys.get('mtime'), keys.get('size'),
+                kind, offset, len(payload),
+                ))
+            payloads.append(payload)
+            offset += len(payload)
+        paths.append((scan_path, entries))
+
+    if not payloads and any(parts for parts in ns.scanned.values()):
+        # every path would answer "no parts" and stop the finder chain
+        raise ValueError('no loaded parts to bundle: {0}'.format(path))
+
+    header = marshal.dumps({
+        'version': VERSION,
+        'magic': cache.magic(),
+        'paths': paths,
+        })
+    data = b''.join([MAGIC, HEADER.pack(len(header)), header] + payloads)
+    if not cache.write_atomic(path, data):
+        raise IOError('unable to write bundle: {0}'.format(path))
+
+    return len(payloads)
+
+
+class Bundle(object):
+    """
+    Memory mapped bundle; parts holds the part dicts for each path
+    """
+
+    def __init__(self, path, mtime):
+        self.path = path
+        self.mtime = mtime
+        with open(path, 'rb') as fp:
+            self.mapping = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            header = self.header()
+        except Exception:
+            self.close()
+            raise
+
+        self.parts = dict()
+        for scan_path, entries in header['paths']:
+            self.parts[scan_path] = tuple(
+                self.part(entry) for entry in entries
+                )
+
+    def header(self):
+        start = len(MAGIC) + HEADER.size
+        if self.mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a settingsd bundle: {0}'.format(self.path))
+
+        size = HEADER.unpack(self.mapping[len(MAGIC):start])[0]
+        header = marshal.loads(self.mapping[start:start + size])
+        if header['version'] != VERSION or header['magic'] != cache.magic():
+            raise ValueError('incompatible bundle: {0}'.format(self.path))
+
+        self.start = start + size
+        return header
+
+    def part(self, entry):
+        (uri, head, tail, name, ext, index, key, tags,
+         mtime, size, kind, offset, length) = entry
+        part = {
+            'uri': uri, 'head': head, 'tail': tail, 'name': name,
+            'ext': ext, 'index': index, 'key': key, 'tags': tags,
+            'mtime': mtime, 'size': size,
+            }
+        start = self.start + offset
+        end = start + length
+        if kind == DIR:
+            part['is_dir'] = True
+        elif kind == CODE:
+            part['get_code'] = functools.partial(self.load, start, end)
+        elif kind == DATA:
+            part['get_data'] = functools.partial(self.load, start, end)
+        else:
+            part['get_data'] = functools.partial(self.read, start, end, kind)
+            part['get_buffer'] = functools.partial(self.view, start, end)
+        return part
+
+    def view(self, start, end):
+        return memoryview(self.mapping)[start:end]
+
+    def load(self, start, end):
+        return marshal.loads(self.view(start, end))
+
+    def read(self, start, end, kind):
+        data = self.mapping[start:end]
+        if kind == TEXT:
+            data = data.decode('utf8')
+        return data
+
+    def close(self):
+        try:
+            self.mapping.close()
+        except BufferError:
+            # lazy loaders still hold views; leave it to the GC
+            pass
+
+
+def _payload(ns, keys):
+    if keys.get('is_dir'):
+        return DIR, b''
+
+    loader = ns.resolve_opt('SETTINGSD_LOADER_FROM_KEY', keys['key'])
+    if not loader:
+        loader = ns.resolve_opt('SETTINGSD_LOADER_FROM_EXT', keys['ext'])
+
+    if loader is loaders.python:
+        return CODE, marshal.dumps(cache.compile_fragment(ns, keys))
+
+    data = keys['get_data']()
+    if loader is loaders.json:
+        if not hasattr(data, 'keys'):
+            from json import loads
+            data = loads(data)
+        return DATA, marshal.dumps(data)
+
+    if isinstance(data, bytes):
+        return BYTES, data
+    return TEXT, data.encode('utf8')
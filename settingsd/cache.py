@@ -0,0 +1,427 @@
+# encoding: utf8
+"""
+Caches
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import hashlib
+import marshal
+import os
+import sys
+import threading
+
+from . import utils
+
+
+# kinds of ContentCache entries
+BYTES, CODE, JSON = 'bytes', 'code', 'json'
+
+# the process-wide ContentCache, see content_cache(...)
+_content = None
+_content_lock = threading.Lock()
+
+# fragment directory -> whether it is a real directory, see bytecode_path(...)
+_heads = dict()
+
+
+def magic():
+    """
+    Return the bytecode magic for the running interpreter
+    """
+    try:
+        from importlib.util import MAGIC_NUMBER
+    except ImportError:
+        from imp import get_magic as MAGIC_NUMBER
+        MAGIC_NUMBER = MAGIC_NUMBER()
+    return MAGIC_NUMBER
+
+
+def cache_tag():
+    """
+    Return the implementation tag used in cache filenames, eg. cpython-311
+    """
+    tag = getattr(sys, 'implementation', None)
+    tag = getattr(tag, 'cache_tag', None)
+    if not tag:
+        tag = 'py{0}{1}'.format(*sys.version_info[:2])
+    return tag
+
+
+def bytecode_path(settings, keys):
+    """
+    Return the cache file for a fragment or None if caching is disabled
+
+    SETTINGSD_BYTECODE_CACHE is either a relative directory, created beside
+    each fragment (like __pycache__), or an absolute directory shared by all
+    fragments. Fragments without a real parent directory (zip members) can
+    only be cached in an absolute directory.
+    """
+    cache_dir = utils.getopt(settings, 'SETTINGSD_BYTECODE_CACHE')
+    if not cache_dir or keys.get('mtime') is None:
+        return None
+
+    tail = '{0}.{1}.pyc'.format(keys['tail'], cache_tag())
+    if os.path.isabs(cache_dir):
+        uri = keys['uri']
+        if not isinstance(uri, bytes):
+            uri = uri.encode('utf8')
+        digest = hashlib.sha1(uri).hexdigest()[:16]
+        return os.path.join(cache_dir, digest + '-' + tail)
+
+    head = keys['head']
+    is_dir = _heads.get(head)
+    if is_dir is None:
+        # once per directory; zip members and the like have none
+        is_dir = _heads[head] = os.path.isdir(head)
+    if not is_dir:
+        return None
+
+    return os.path.join(keys['head'], cache_dir, tail)
+
+
+def bytecode_load(path, keys):
+    """
+    Return the cached code object for keys, if present and fresh
+    """
+    stamp = (magic(), keys['uri'], keys['mtime'], keys['size'])
+    try:
+        with open(path, 'rb') as fp:
+            if marshal.load(fp) != stamp:
+                return None
+            return marshal.load(fp)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def bytecode_dump(path, keys, code):
+    """
+    Atomically write code to the cache; failures are silently ignored
+    """
+    if sys.dont_write_bytecode:
+        return False
+
+    stamp = (magic(), keys['uri'], keys['mtime'], keys['size'])
+    data = marshal.dumps(stamp) + marshal.dumps(code)
+    return write_atomic(path, data)
+
+
+def write_atomic(path, data, mode=None):
+    """
+    Write data to path via rename; return False if path is unwritable
+
+    With mode, the file is created with those permissions, and never through
+    a file or link already at the temporary path.
+    """
+    temp = '{0}.{1}.tmp'.format(path, os.getpid())
+    try:
+        head = os.path.dirname(path)
+        if head and not os.path.isdir(head):
+            os.makedirs(head)
+        if mode is None:
+            fp = open(temp, 'wb')
+        else:
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+            fp = os.fdopen(os.open(temp, flags, mode), 'wb')
+        with fp:
+            fp.write(data)
+        os.rename(temp, path)
+    except (IOError, OSError):
+        # read-only or otherwise unusable location
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        return False
+
+    return True
+
+
+def compile_fragment(settings, keys):
+    """
+    Return a code object for keys, preferring the content cache, then
+    SETTINGSD_BYTECODE_CACHE
+    """
+    if keys.get('code') is not None:
+        # compiled ahead of time by prefetch.Prefetcher
+        return keys['code']
+    if keys.get('get_code') is not None:
+        # precompiled, eg. by bundle.build
+        return keys['get_code']()
+
+    path = bytecode_path(settings, keys)
+    data, code = load_code(keys['get_data'], keys, path,
+                           content_cache(settings))
+    return code
+
+
+def load_code(get_data, keys, path, content):
+    """
+    Return (data, code) for keys; data is utils.MISSING if never read
+
+    Safe to call from any thread.
+    """
+    if content is not None:
+        code = content.get(CODE, keys)
+        if code is not utils.MISSING:
+            return utils.MISSING, code
+
+    if path:
+        code = bytecode_load(path, keys)
+        if code is not None:
+            if content is not None:
+                content.put(CODE, keys, code)
+            return utils.MISSING, code
+
+    data = get_data()
+    if content is not None:
+        code = content.find(CODE, keys, data)
+        if code is not utils.MISSING:
+            return data, code
+
+    #TODO: SETTINGSD_COMPILE_FLAGS
+    code = compile(data, keys['uri'], 'exec')
+    if path:
+        bytecode_dump(path, keys, code)
+    if content is not None:
+        content.put(CODE, keys, code, data)
+    return data, code
+
+
+def load_json(settings, keys):
+    """
+    Return the parsed JSON part for keys, through the content cache
+
+    Parsed values are cached marshalled, so every caller gets its own copy.
+    """
+    from json import loads
+
+    content = content_cache(settings)
+    if content is not None:
+        packed = content.get(JSON, keys)
+        if packed is not utils.MISSING:
+            return marshal.loads(packed)
+
+    data = keys['get_data']()
+    if hasattr(data, 'keys'):
+        # parsed ahead of time, eg. by bundle.build
+        return data
+    if content is None:
+        return loads(data)
+
+    packed = content.find(JSON, keys, data)
+    if packed is not utils.MISSING:
+        return marshal.loads(packed)
+
+    if isinstance(data, bytes):
+        data = data.decode('utf8')
+    value = loads(data)
+    if len(data) > content.limit:
+        # never fits; don't pack it only to throw it away
+        return value
+    try:
+        packed = marshal.dumps(value)
+    except ValueError:
+        return value
+    content.put(JSON, keys, packed, data, cost=len(packed))
+    return value
+
+
+def load_bytes(settings, keys):
+    """
+    Return the raw part for keys, through the content cache
+    """
+    content = content_cache(settings)
+    if content is not None:
+        data = content.get(BYTES, keys)
+        if data is not utils.MISSING:
+            return data
+
+    data = keys['get_data']()
+    if content is not None:
+        content.put(BYTES, keys, data, data)
+    return data
+
+
+def content_cache(settings):
+    """
+    Return the process-wide ContentCache per SETTINGSD_CONTENT_CACHE, or None
+    """
+    global _content
+
+    limit = utils.getopt(settings, 'SETTINGSD_CONTENT_CACHE')
+    if not limit:
+        return None
+
+    if _content is None:
+        with _content_lock:
+            if _content is None:
+                _content = ContentCache(limit)
+    # the most recent assembly decides
+    _content.limit = limit
+    return _content
+
+
+def clear():
+    """
+    Forget every entry of the content cache, eg. to measure cold assembly
+    """
+    if _content is not None:
+        _content.clear()
+
+
+def stats():
+    """
+    Return hits, misses, hit_rate, evictions, entries, size and limit of
+    the content cache
+    """
+    if _content is None:
+        return ContentCache(0).stats()
+    return _content.stats()
+
+
+class ContentCache(object):
+    """
+    LRU of part contents shared by every assembly in the process
+
+    Entries are addressed by content: the sha1 of the data read, plus the
+    URI for code (it records its filename), or by (uri, mtime, size) alone
+    when the data was never read, eg. code from SETTINGSD_BYTECODE_CACHE.
+    Every (kind, uri, mtime, size) stamp seen points at its entry, so later
+    assemblies hit without reading anything, and identical parts at other
+    URIs hit after a read, without parsing. Stamps are trusted as given:
+    finders stat every part anew on each scan. Entries cost roughly the size
+    of their data; the least recently used are evicted beyond limit bytes.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        # entry key -> [value, cost, stamps]
+        self.entries = collections.OrderedDict()
+        self.stamps = dict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind, keys):
+        """
+        Return the value cached for the stamp of keys, or utils.MISSING
+        """
+        stamp = _stamp(kind, keys)
+        if stamp is None:
+            return utils.MISSING
+
+        with self.lock:
+            entry_key = self.stamps.get(stamp)
+            if entry_key is None:
+                return utils.MISSING
+
+            self.hits += 1
+            entry = self.entries[entry_key] = self.entries.pop(entry_key)
+            return entry[0]
+
+    def has(self, kind, keys):
+        """
+        Return True if get(kind, keys) would hit, without counting it
+        """
+        stamp = _stamp(kind, keys)
+        if stamp is None:
+            return False
+
+        with self.lock:
+            return stamp in self.stamps
+
+    def find(self, kind, keys, data):
+        """
+        Return the value cached for data read from keys, or utils.MISSING
+        """
+        entry_key = _address(kind, keys, data)
+        stamp = _stamp(kind, keys)
+        with self.lock:
+            entry = self.entries.pop(entry_key, None)
+            if entry is None:
+                return utils.MISSING
+
+            self.hits += 1
+            self.entries[entry_key] = entry
+            if stamp:
+                self._link(stamp, entry_key, entry)
+            return entry[0]
+
+    def put(self, kind, keys, value, data=None, cost=None):
+        """
+        Cache value for keys, and data read from keys if known
+        """
+        stamp = _stamp(kind, keys)
+        if data is not None:
+            entry_key = _address(kind, keys, data)
+        else:
+            entry_key = stamp
+        if cost is None:
+            cost = len(data) if data is not None else keys.get('size') or 0
+
+        with self.lock:
+            self.misses += 1
+            if entry_key is None or cost > self.limit:
+                return
+
+            self._drop(self.entries.pop(entry_key, None))
+            entry = self.entries[entry_key] = [value, cost, set()]
+            self.size += cost
+            if stamp:
+                self._link(stamp, entry_key, entry)
+            while self.size > self.limit:
+                self._drop(self.entries.popitem(last=False)[1])
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stamps.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': lookups and float(self.hits) / lookups,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.size,
+                'limit': self.limit,
+                }
+
+    def _link(self, stamp, entry_key, entry):
+        old = self.stamps.get(stamp)
+        if old is not None and old != entry_key and old in self.entries:
+            self.entries[old][2].discard(stamp)
+        self.stamps[stamp] = entry_key
+        entry[2].add(stamp)
+
+    def _drop(self, entry):
+        if entry is None:
+            return
+        self.size -= entry[1]
+        for stamp in entry[2]:
+            self.stamps.pop(stamp, None)
+
+
+def _stamp(kind, keys):
+    if keys.get('mtime') is None:
+        return None
+    return (kind, keys['uri'], keys['mtime'], keys.get('size'))
+
+
+def _address(kind, keys, data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf8')
+    address = (kind, hashlib.sha1(data).hexdigest())
+    if kind == CODE:
+        address += (keys['uri'],)
+    return address
@@ -12,7 +12,9 @@ SETTINGSD_NS = '__dict__'
 SETTINGSD_BASES = ['settingsd.base:BaseSettings']
 
 SETTINGSD_FINDERS = [
+    'settingsd.finders:bundle',
     'settingsd.finders:directory',
+    'settingsd.finders:sqlite',
     'settingsd.finders:zipfile',
     ]
 
@@ -26,3 +28,51 @@ SETTINGSD_LOADER_FROM_EXT = {
         '.json': 'settingsd.loaders:json',
         }
 SETTINGSD_LOADER_FROM_KEY = dict()
+
+# relative: cache dir beside each fragment; absolute: shared cache dir
+SETTINGSD_BYTECODE_CACHE = '__pycache__'
+
+# file to snapshot whole assemblies of data-only trees to
+SETTINGSD_SNAPSHOT = None
+
+# read zip archive members through a shared mmap instead of a file handle
+SETTINGSD_ZIPFILE_MMAP = False
+
+# record part dependencies so Settingsd.reassemble() only executes changes
+SETTINGSD_INCREMENTAL = False
+
+# install immutable, namespace-free settings (see base.FrozenSettings)
+SETTINGSD_FROZEN = False
+
+# record per-part load timings, see ns.profile() ('memory' also traces)
+SETTINGSD_PROFILE = False
+
+# count reads per key, see ns.stats() (N counts one in N reads)
+SETTINGSD_STATS = False
+
+# record which part wrote each key, for trace()/source()/show()
+SETTINGSD_PROVENANCE = True
+
+# drop part modules (and their sys.modules entries) after assembly
+SETTINGSD_PRUNE_PARTS = False
+
+# a shared snapshot (eg. in /dev/shm) for pre-fork workers, see snapshot.py
+SETTINGSD_SHARED = None
+
+# threads reading (and compiling) upcoming parts during assembly; 0 is off
+SETTINGSD_PREFETCH = 0
+
+# a bundle built by `python -m settingsd bundle`, consulted before any path
+SETTINGSD_BUNDLE = None
+
+# bytes of parts (code, parsed JSON, ...) shared by assemblies; 0 is off
+SETTINGSD_CONTENT_CACHE = 0
+
+# loaders.json_stream binds members this large (bytes) lazily; 0 never
+SETTINGSD_JSON_LAZY_BYTES = 0
+
+# active tags for guarded parts (50-cache@prod.py); a set, or "prod,eu"
+SETTINGSD_TAGS = frozenset()
+
+# open SQLite part databases immutable (replace them, never write in place)
+SETTINGSD_SQLITE_IMMUTABLE = True
@@ -6,51 +6,362 @@ Finders
 from __future__ import absolute_import
 from __future__ import print_function
 
+import functools
+import mmap
+
 from . import utils
 
 
+# process-wide directory listings: path -> (mtime, fragment names)
+_listings = dict()
+
+# process-wide zip archive indexes: archive path -> ArchiveIndex
+_archives = dict()
+
+# process-wide bundles: bundle path -> bundle.Bundle
+_bundles = dict()
+
+# process-wide SQLite connections: database path -> SQLiteIndex
+_databases = dict()
+
+
+def invalidate(path=None):
+    """
+    Forget the cached listing of path, or of every directory and archive
+
+    Listings are revalidated against the directory mtime, which only changes
+    when entries are added, removed or renamed; fragments are stat'ed anew
+    on every scan, so edits in place are always seen.
+
+    Archive, database and bundle handles are dropped rather than closed:
+    parts already handed out (eg. to lazy loaders) may still read through
+    them, and they close once nothing references them.
+    """
+    if path is None:
+        _listings.clear()
+        _archives.clear()
+        _bundles.clear()
+        _databases.clear()
+    else:
+        _listings.pop(path, None)
+        _archives.pop(path, None)
+        _bundles.pop(path, None)
+        _databases.pop(path, None)
+
+
+def bundle(settings, path):
+    """
+    Return the parts SETTINGSD_BUNDLE recorded for path, if any
+    """
+    import os
+    from .bundle import Bundle
+
+    source = utils.getopt(settings, 'SETTINGSD_BUNDLE')
+    if not source:
+        return None
+
+    try:
+        st = os.stat(source)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    index = _bundles.get(source)
+    if not index or index.mtime != st.st_mtime:
+        try:
+            index = Bundle(source, st.st_mtime)
+        except (IOError, OSError, ValueError, EOFError, KeyError, TypeError):
+            return None
+        # the stale index closes once settings stop reading through it
+        _bundles[source] = index
+
+    return index.parts.get(path)
+
+
 def directory(settings, path):
     import os
+    import stat
 
-    if not os.path.isdir(path):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError, ValueError):
         return None
 
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+
+    listing = _listings.get(path)
+    if not listing or listing[0] != st.st_mtime:
+        # keep fragment names only; stat info goes stale under edits
+        names = sorted(
+            entry.name for entry in _scandir(path)
+            if utils.keys_from_uri(entry.name)
+            )
+        listing = _listings[path] = (st.st_mtime, tuple(names))
+
+    # stat every time: editing a fragment in place leaves the directory
+    # mtime alone, and mtime/size stamp the bytecode and content caches
     parts = list()
-    for name in sorted(os.listdir(path)):
+    for name in listing[1]:
         part = {'uri': os.path.join(path, name)}
+        try:
+            entry_st = os.stat(part['uri'])
+            part['mtime'], part['size'] = entry_st.st_mtime, entry_st.st_size
+            part['is_dir'] = stat.S_ISDIR(entry_st.st_mode)
+        except OSError:
+            pass
 
-        def get_data(part=part):
-            with open(part['uri']) as fp:
-                return fp.read()
-
-        part['get_data'] = get_data
+        part['get_data'] = functools.partial(_read_file, part['uri'])
         parts.append(part)
 
-    return parts
+    return tuple(parts)
+
+
+def _split_archive(path):
+    """
+    Return (archive, prefix, stat) for a path within a file, or Nones
+
+    Walks up path until it hits a file (zip archive, database, ...); prefix
+    is the list of path components below it.
+    """
+    import os
+    import stat
+
+    archive, prefix = path, list()
+    while True:
+        try:
+            st = os.stat(archive)
+        except (OSError, TypeError, ValueError):
+            st = None
+        if st is not None:
+            if stat.S_ISDIR(st.st_mode):
+                return None, None, None
+            return archive, prefix, st
+
+        head, tail = os.path.split(archive)
+        if not tail or head == archive:
+            return None, None, None
+        archive = head
+        prefix.insert(0, tail)
+
+
+def _scandir(path):
+    import os
+
+    if hasattr(os, 'scandir'):
+        return os.scandir(path)
+
+    class DirEntry(object):
+
+        def __init__(self, name):
+            self.name = name
+
+        def stat(self):
+            return os.stat(os.path.join(path, self.name))
+
+    return [DirEntry(name) for name in os.listdir(path)]
+
+
+def _read_file(uri):
+    with open(uri) as fp:
+        return fp.read()
 
 
 def zipfile(settings, path):
-    import zipimport
+    from zipfile import BadZipfile
 
-    try:
-        # abuse zipimport over zipfile because it's faster and potentially
-        # cached if we are already operating/importing from the archive
-        importer = zipimport.zipimporter(path)
-    except zipimport.ZipImportError:
+    archive, prefix, st = _split_archive(path)
+    if archive is None:
         return None
 
-    parts = list()
-    for info in sorted(importer._files.values()):
-        if not info[0].startswith(path):
-            # random item in archive we don't care about
-            continue
+    index = _archives.get(archive)
+    if not index or index.mtime != st.st_mtime:
+        use_mmap = utils.getopt(settings, 'SETTINGSD_ZIPFILE_MMAP')
+        try:
+            index = ArchiveIndex(archive, st.st_mtime, mmap=use_mmap)
+        except (IOError, OSError, ValueError, BadZipfile):
+            return None
+        # the stale index closes once settings stop reading through it
+        _archives[archive] = index
 
-        part = {'uri': info[0]}
+    return index.parts.get('/'.join(prefix), ())
 
-        def get_data(part=part):
-            return importer.get_data(part['uri'])
 
-        part['get_data'] = get_data
-        parts.append(part)
+class ArchiveIndex(object):
+    """
+    Parts in a zip archive, indexed by member directory
+
+    The archive is opened once and members are read through the same
+    handle, optionally memory mapped.
+    """
+
+    def __init__(self, archive, mtime, mmap=False):
+        import os
+        import time
+        import zipfile
+
+        self.archive = archive
+        self.mtime = mtime
+        if mmap:
+            with open(archive, 'rb') as fp:
+                handle = MappedFile(fp.fileno(), 0, access=MappedFile.READ)
+        else:
+            handle = open(archive, 'rb')
+        try:
+            self.zipfile = zipfile.ZipFile(handle)
+        except Exception:
+            handle.close()
+            raise
+
+        parts = dict()
+        for info in self.zipfile.infolist():
+            head, _, tail = info.filename.rpartition('/')
+            if not tail or not utils.keys_from_uri(tail):
+                continue
+
+            uri = os.path.join(archive, *info.filename.split('/'))
+            part = {
+                'uri': uri,
+                'size': info.file_size,
+                'mtime': time.mktime(info.date_time + (0, 0, -1)),
+                'get_data': functools.partial(self.read, info.filename),
+                }
+            parts.setdefault(head, list()).append(part)
+
+        self.parts = dict(
+            (head, tuple(sorted(dir_parts, key=lambda part: part['uri'])))
+            for head, dir_parts in parts.items()
+            )
+
+    def read(self, name):
+        return self.zipfile.read(name)
+
+    def close(self):
+        handle = self.zipfile.fp
+        self.zipfile.close()
+        if handle:
+            handle.close()
+
+    def __del__(self):
+        # replaced indexes are dropped, not closed; see invalidate(...)
+        if getattr(self, 'zipfile', None) is not None:
+            self.close()
+
+
+def sqlite(settings, path):
+    """
+    Return parts stored in a SQLite database (see SQLiteIndex)
+    """
+    database, prefix, st = _split_archive(path)
+    if database is None or not database.endswith(SQLiteIndex.SUFFIXES):
+        return None
+
+    index = _databases.get(database)
+    if not index or index.mtime != st.st_mtime:
+        immutable = utils.getopt(settings, 'SETTINGSD_SQLITE_IMMUTABLE')
+        try:
+            index = SQLiteIndex(database, st.st_mtime, immutable=immutable)
+        except Exception:
+            # missing sqlite3, not a database, no parts table, ...
+            return None
+        # the stale index closes once settings stop reading through it
+        _databases[database] = index
+
+    return index.find('/'.join(prefix))
+
+
+class SQLiteIndex(object):
+    """
+    Parts stored as rows of a SQLite database, through one connection
+
+    A path of /srv/fleet.sqlite lists the parts stored with an empty dir,
+    /srv/fleet.sqlite/prod those stored with dir 'prod'::
+
+        CREATE TABLE settingsd_parts (
+            dir TEXT NOT NULL DEFAULT '',
+            tail TEXT NOT NULL,  -- file name, eg. 10-base.py
+            idx INTEGER NOT NULL,  -- 10
+            name TEXT NOT NULL,  -- 10-base
+            mtime REAL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (dir, idx, name)
+            );
+
+    The database is opened read-only and, unless SETTINGSD_SQLITE_IMMUTABLE
+    is False, immutable (no locking; replace the file rather than write to
+    it). The connection is reopened when the file's mtime changes.
+    """
+
+    SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+
+    LIST = (
+        'SELECT rowid, tail, mtime, length(data) FROM settingsd_parts'
+        ' WHERE dir = ? ORDER BY idx, name'
+        )
+    READ = 'SELECT data FROM settingsd_parts WHERE rowid = ?'
+
+    def __init__(self, database, mtime, immutable=True):
+        import sqlite3
+        import threading
+
+        self.database = database
+        self.mtime = mtime
+        self.lock = threading.Lock()
+        try:
+            from urllib.parse import quote
+        except ImportError:
+            from urllib import quote
+        uri = 'file:{0}?mode=ro'.format(quote(database))
+        if immutable:
+            uri += '&immutable=1'
+        try:
+            self.connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=False,
+                )
+        except TypeError:
+            # no URI support (python2); read-only by convention only
+            self.connection = sqlite3.connect(
+                database, check_same_thread=False,
+                )
+        self.listings = dict()
+
+    def find(self, prefix):
+        import os
+
+        parts = self.listings.get(prefix)
+        if parts is not None:
+            return parts
+
+        with self.lock:
+            rows = self.connection.execute(self.LIST, (prefix,)).fetchall()
+
+        head = os.path.join(self.database, *prefix.split('/'))
+        parts = tuple(
+            {
+                'uri': os.path.join(head, tail),
+                'mtime': mtime if mtime is not None else self.mtime,
+                'size': size,
+                'get_data': functools.partial(self.read, rowid),
+                }
+            for rowid, tail, mtime, size in rows
+            )
+        self.listings[prefix] = parts
+        return parts
+
+    def read(self, rowid):
+        with self.lock:
+            row = self.connection.execute(self.READ, (rowid,)).fetchone()
+        return bytes(row[0])
+
+    def close(self):
+        self.connection.close()
+
+
+class MappedFile(mmap.mmap):
+    """
+    Read-only mmap usable as a zipfile.ZipFile file object
+    """
+
+    READ = mmap.ACCESS_READ
 
-    return parts
+    def seekable(self):
+        return True
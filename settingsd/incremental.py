@@ -0,0 +1,214 @@
+# encoding: utf8
+"""
+Dependency tracking for incremental reassembly
+
+With SETTINGSD_INCREMENTAL, every part records the keys it reads (through
+Settingsd.__getitem__), the keys it writes (through Settingsd.__setitem__)
+and the values it leaves behind. Settingsd.reassemble() then walks the parts
+again and, for each one:
+
+  * replays the recorded writes if the part, and every key it read, is
+    unchanged since the last assembly
+  * executes it otherwise, marking everything it writes as changed
+
+Replaying the unaffected prefix rebuilds the namespace exactly as it stood
+before the first affected part, without executing anything.
+
+Recorded values are deep copies of plain data (scalars, modules and
+containers thereof) so later in-place mutation cannot leak into them. Parts
+reading __path__ or binding anything else (functions, classes, arbitrary
+objects) are always executed.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import copy
+import types
+
+from . import utils
+
+
+try:
+    _ATOMS = (type(None), bool, int, long, float, complex, str, unicode)
+except NameError:
+    _ATOMS = (type(None), bool, int, float, complex, str, bytes)
+_ATOMS += (types.ModuleType,)
+
+
+class Record(object):
+    """
+    Everything needed to replay a part without executing it
+    """
+
+    __slots__ = (
+        'identity', 'reads', 'writes', 'values',
+        'dist', 'doc', 'overrides', 'rerun',
+        )
+
+    def __init__(self, identity):
+        self.identity = identity
+        self.reads = set()
+        self.writes = list()
+        self.values = collections.OrderedDict()
+        self.dist = list()
+        self.doc = None
+        self.overrides = dict()
+        self.rerun = False
+
+
+class Tracker(object):
+
+    def __init__(self, previous=None):
+        # records of the last assembly, in execution order
+        self.previous = previous or collections.OrderedDict()
+        self.records = collections.OrderedDict()
+        self.current = None
+        # keys whose value may differ from the last assembly
+        self.dirty = set()
+        self.visited = set()
+        self.order = list(self.previous)
+        self.position = 0
+        # a part changed SETTINGSD_* config; execute everything after it
+        self.flush = False
+
+    def read(self, key):
+        if self.current is None:
+            return
+
+        if key == '__builtins__' or key.startswith('SETTINGSD_'):
+            # lookup machinery, not dependencies
+            return
+
+        self.current.reads.add(key)
+
+    def write(self, ns, key, attr):
+        if self.current is None:
+            return
+
+        if key.startswith('SETTINGSD_'):
+            if utils.equal(dict.get(ns, key, utils.MISSING), attr):
+                # Settingsd.__getitem__ writing back a copied default
+                return
+            self.flush = True
+
+        self.current.writes.append(key)
+
+    def provenance(self, key):
+        if self.current is not None:
+            self.current.dist.append(key)
+
+    def replayable(self, info):
+        """
+        Return the previous Record for info if it can be replayed
+        """
+        name = info['name']
+        self.visited.add(name)
+        record = self.previous.get(name)
+
+        # anything skipped (removed/reordered) may no longer write its keys
+        try:
+            stop = self.order.index(name, self.position)
+        except ValueError:
+            stop = self.position
+        while self.position < stop:
+            skipped = self.order[self.position]
+            if skipped not in self.visited:
+                self.dirty.update(self.previous[skipped].values)
+            self.position += 1
+        if self.order[self.position:self.position + 1] == [name]:
+            self.position += 1
+
+        if (
+                self.flush or
+                record is None or
+                record.rerun or
+                record.identity != identity(info) or
+                not record.reads.isdisjoint(self.dirty)
+                ):
+            return None
+
+        return record
+
+    def begin(self, info):
+        self.current = Record(identity(info))
+
+    def end(self, ns, info, part):
+        record, self.current = self.current, None
+        touched = collections.OrderedDict.fromkeys(record.writes)
+        for key in sorted(record.reads):
+            attr = dict.get(ns, key, utils.MISSING)
+            if attr is not utils.MISSING and not isinstance(attr, _ATOMS):
+                # possibly mutated in place
+                touched[key] = None
+
+        for key in touched:
+            attr = dict.get(ns, key, utils.MISSING)
+            if attr is not utils.MISSING and not _plain(attr):
+                record.rerun = True
+            record.values[key] = _copy(attr)
+
+        if '__path__' in record.reads:
+            record.rerun = True
+
+        override = ns.type_overrides.get(info['key'])
+        if override is not None:
+            record.overrides[info['key']] = override
+        record.doc = part.__doc__
+
+        # only keys now holding a different value affect later parts
+        previous = self.previous.get(info['name'])
+        previous = previous.values if previous else dict()
+        for key in set(previous).union(record.values):
+            attr = previous.get(key, utils.MISSING)
+            if not utils.equal(attr, record.values.get(key, utils.MISSING)):
+                self.dirty.add(key)
+
+        self.records[info['name']] = record
+
+    def replay(self, ns, info, part, record):
+        for key, attr in record.values.items():
+            ns.touch(key)
+            if attr is utils.MISSING:
+                if dict.__contains__(ns, key):
+                    collections.OrderedDict.__delitem__(ns, key)
+                continue
+
+            collections.OrderedDict.__setitem__(ns, key, _copy(attr))
+
+        for key in record.dist:
+            if ns.provenance is not None:
+                ns.provenance.record(key)
+            setattr(part, key, dict.get(ns, key))
+
+        part.__doc__ = record.doc
+        ns.type_overrides.update(record.overrides)
+        self.records[info['name']] = record
+
+
+def identity(info):
+    return (info['uri'], info.get('mtime'), info.get('size'))
+
+
+def _plain(attr):
+    if isinstance(attr, _ATOMS):
+        return True
+
+    if isinstance(attr, (tuple, list, set, frozenset)):
+        return all(_plain(item) for item in attr)
+
+    if isinstance(attr, dict):
+        return all(_plain(k) and _plain(v) for k, v in attr.items())
+
+    return False
+
+
+def _copy(attr):
+    if attr is utils.MISSING or isinstance(attr, _ATOMS):
+        return attr
+
+    try:
+        return copy.deepcopy(attr)
+    except Exception:
+        return attr
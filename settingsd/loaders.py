@@ -6,6 +6,10 @@ Loaders
 from __future__ import absolute_import
 from __future__ import print_function
 
+import codecs
+import functools
+import re
+
 from . import utils
 
 
@@ -22,54 +26,311 @@ def from_ext(settings, keys):
 def _load_from(settings, keys, suffix):
     datum = keys[suffix.lower()]
     opt = 'SETTINGSD_LOADER_FROM_' + suffix.upper()
-    registry = utils.getopt(settings, opt)
-    loader = registry.get(datum)
-    if loader and not hasattr(loader, '__call__'):
-        loader = utils.resolve_import(settings, loader)
+    loader = utils.namespace(settings).resolve_opt(opt, datum)
     if loader:
         loader = loader(settings, keys)
     return loader
 
 
 def python(settings, keys):
+    from .cache import compile_fragment
+    from .profiling import measure
     ns = utils.namespace(settings)
-    #TODO: SETTINGSD_COMPILE_FLAGS
-    code = keys['get_data']()
-    code = compile(code, keys['uri'], 'exec')
+    with measure(settings, keys, 'compile'):
+        code = compile_fragment(settings, keys)
     # eval can handle code objects compiled with exec (python[23])
-    eval(code, ns)
+    with measure(settings, keys, 'exec'):
+        eval(code, ns)
     # signal successful loading
     return True
 
 
 def json(settings, keys):
-    from json import loads
+    from .cache import load_json
     ns = utils.namespace(settings)
-    new_ns = keys['get_data']()
-    if not hasattr(new_ns, 'keys'):
-        new_ns = loads(new_ns)
+    new_ns = load_json(settings, keys)
     # ensure stable load ordering
     for k in new_ns:
         ns[k] = new_ns[k]
     return True
 
 
-class JSONLoader(object):
+def json_stream(settings, keys):
+    """
+    Bind each top-level key of a JSON object part as soon as it is parsed
+
+    The part is memory mapped (like LazyLoader) and decoded a window at a
+    time, member by member, so the whole text and the whole parsed tree are
+    never held at once. Members of at least SETTINGSD_JSON_LAZY_BYTES are
+    bound as JSONLoader descriptors instead, parsed on first access.
+    """
+    from json import JSONDecoder
+    import mmap
+
+    ns = utils.namespace(settings)
+    buf = _map_part(settings, keys)
+    if hasattr(buf, 'keys'):
+        # parsed ahead of time, eg. by bundle.build
+        for k in buf:
+            ns[k] = buf[k]
+        return True
+
+    lazy = utils.getopt(settings, 'SETTINGSD_JSON_LAZY_BYTES')
+    decoder = JSONDecoder()
+    view = memoryview(buf)
+    deferred = False
+    try:
+        reader = _JSONReader(view, keys['uri'])
+        more = reader.open()
+        while more:
+            k = reader.key()
+            value = reader.decode(decoder, lazy)
+            if value is utils.MISSING:
+                # too big; find where it ends without keeping what it holds
+                start = reader.tell()
+                reader.decode(_json_skipper())
+                member = dict(keys, key=k)
+                member['get_buffer'] = functools.partial(
+                    _json_slice, view, start, reader.tell(),
+                    )
+                ns.type_overrides[k] = JSONLoader(settings, member)
+                ns[k] = keys['uri']
+                deferred = True
+            else:
+                ns[k] = value
+            more = reader.next()
+    finally:
+        if not deferred:
+            # JSONLoader members keep the mapping open
+            view.release()
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+    return True
+
+
+# bytes decoded at a time; more while a member runs past the end
+_JSON_WINDOW = 1 << 20
+
+_JSON_SPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _json_discard(pairs):
+    return None
+
+
+def _json_skipper():
+    from json import JSONDecoder
+    return JSONDecoder(object_pairs_hook=_json_discard)
+
+
+def _json_fail(uri, pos, expected):
+    raise ValueError('{0}: expected {1} at byte {2}'.format(
+        uri, expected, pos,
+        ))
+
+
+class _JSONReader(object):
+    """
+    Decoded window over the UTF-8 bytes of a JSON object, read member by
+    member
+
+    Every member in the window is decoded in place; the window is only
+    moved (and grown, if one member does not fit) when a member runs past
+    its end, so each byte is decoded about once.
+    """
+
+    def __init__(self, buf, uri):
+        self.buf = buf
+        self.uri = uri
+        self.size = _JSON_WINDOW
+        self.text = ''
+        # position in text, and where text starts and ends in buf
+        self.idx = self.base = self.end = 0
+        # last (text position, byte offset) counted, for non-ASCII text
+        self.mark = (0, 0)
+        self.final = False
+        self.refill()
+
+    def refill(self):
+        pos = self.tell()
+        total = len(self.buf)
+        end = min(pos + max(self.size, 2 * (self.end - pos)), total)
+        while end < total and ord(self.buf[end:end + 1].tobytes()) >> 6 == 2:
+            # never split a UTF-8 sequence
+            end += 1
+        self.text = codecs.decode(self.buf[pos:end], 'utf8')
+        self.idx, self.base, self.end = 0, pos, end
+        self.mark = (0, pos)
+        self.final = end == total
+
+    def tell(self, idx=None):
+        """
+        Return the byte offset of idx (default: the current position)
+        """
+        if idx is None:
+            idx = self.idx
+        if len(self.text) == self.end - self.base:
+            # ASCII
+            return self.base + idx
+
+        mark, pos = self.mark
+        if idx < mark:
+            pos -= len(self.text[idx:mark].encode('utf8'))
+        else:
+            pos += len(self.text[mark:idx].encode('utf8'))
+        self.mark = (idx, pos)
+        return pos
+
+    def fail(self, expected):
+        _json_fail(self.uri, self.tell(), expected)
+
+    def peek(self):
+        # skip whitespace; return the next character, or '' at the end
+        while True:
+            self.idx = _JSON_SPACE.match(self.text, self.idx).end()
+            if self.idx < len(self.text) or self.final:
+                return self.text[self.idx:self.idx + 1]
+            self.refill()
+
+    def open(self):
+        # True if the object has members
+        if self.peek() != '{':
+            self.fail('an object')
+        self.idx += 1
+        if self.peek() == '}':
+            return self.next()
+        return True
+
+    def next(self):
+        # True if another member follows
+        char = self.peek()
+        if char == '}':
+            self.idx += 1
+            if self.peek():
+                self.fail('the end')
+            return False
+        if char != ',':
+            self.fail("',' or '}'")
+        self.idx += 1
+        return True
+
+    def key(self):
+        # the next member's key; leaves the position at its value
+        from json.decoder import scanstring
+
+        while True:
+            if self.peek() != '"':
+                self.fail('a key')
+            try:
+                key, self.idx = scanstring(self.text, self.idx + 1)
+                break
+            except ValueError:
+                if self.final:
+                    self.fail('a key')
+            self.refill()
+        if self.peek() != ':':
+            self.fail("':'")
+        self.idx += 1
+        self.peek()
+        return key
+
+    def decode(self, decoder, limit=0):
+        """
+        Return the value at the current position, or utils.MISSING if it
+        takes limit bytes or more
+        """
+        while True:
+            try:
+                value, stop = decoder.raw_decode(self.text, self.idx)
+                # a number may continue past the window, even after "1."
+                follow = _JSON_SPACE.match(self.text, stop).end()
+                if self.final or self.text[follow:follow + 1] in (',', '}'):
+                    break
+            except ValueError as e:
+                if self.final:
+                    msg = '{0}: {1}, in the value at byte {2}'
+                    raise ValueError(msg.format(self.uri, e, self.tell()))
+            if limit and self.end - self.tell() >= limit:
+                return utils.MISSING
+            self.refill()
+
+        if limit and self.tell(stop) - self.tell() >= limit:
+            return utils.MISSING
+        self.idx = stop
+        return value
+
+
+def _json_slice(view, start, end):
+    return view[start:end]
+
+
+class LazyLoader(object):
+    """
+    Descriptor deferring a data part until first attribute access
+
+    Select per part via SETTINGSD_LOADER_FROM_KEY or SETTINGSD_LOADER_FROM_EXT.
+    Parts on disk are memory mapped; `raw` is a zero-copy memoryview of the
+    part and is also the value unless a subclass overrides parse(...). The
+    parsed value is cached after the first access.
+    """
 
     def __init__(self, settings, keys):
+        self.settings = settings
         self.keys = keys
-        self.cache = None
+        self.cache = utils.MISSING
+        self.mapping = None
 
     def __get__(self, settings, owner):
         if settings is None:
             return self
 
-        if not self.cache:
-            from json import loads
-            data = keys['get_data']()
-            self.cache = loads(data)
+        if self.cache is utils.MISSING:
+            self.cache = self.parse(self.raw)
 
         return self.cache
 
     def __set__(self, settings, value):
         pass
+
+    @property
+    def raw(self):
+        if self.mapping is None:
+            self.mapping = _map_part(self.settings, self.keys)
+        return memoryview(self.mapping)
+
+    def parse(self, raw):
+        return raw
+
+
+class TextLoader(LazyLoader):
+
+    def parse(self, raw):
+        return raw.tobytes().decode('utf8')
+
+
+class JSONLoader(LazyLoader):
+
+    def parse(self, raw):
+        from json import loads
+        return loads(raw.tobytes().decode('utf8'))
+
+
+def _map_part(settings, keys):
+    import mmap
+    from .cache import load_bytes
+
+    if keys.get('get_buffer') is not None:
+        # already mapped, eg. a bundle entry
+        return keys['get_buffer']()
+
+    try:
+        with open(keys['uri'], 'rb') as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        # not a real file (zip member, etc) or empty (cannot be mapped)
+        pass
+
+    data = load_bytes(settings, keys)
+    if not isinstance(data, bytes):
+        data = data.encode('utf8')
+    return data
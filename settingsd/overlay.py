@@ -0,0 +1,101 @@
+# encoding: utf8
+"""
+Context-local overrides
+
+    with settings.override(FEATURE_X=True, TIMEOUT=1):
+        ...
+
+    @settings.override(DEBUG=True)
+    def test_debug():
+        ...
+
+Overrides apply to the current thread or asyncio task, and to tasks it
+creates, until the block (or decorated call) exits; nested overrides stack.
+The namespace is never copied or changed. The first override of a key
+installs a base.OverriddenKey descriptor for it on the settings class, so
+reading an overridden key costs one ContextVar lookup, and keys never
+overridden are read exactly as before.
+
+Python 3.7+ only (contextvars); BaseSettings.override imports this lazily.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import contextvars
+import functools
+import inspect
+import threading
+
+from . import base
+from . import utils
+
+
+# serializes installing descriptors and ContextVars on settings classes
+_lock = threading.Lock()
+
+
+class Override(object):
+    """
+    Context manager and decorator applying keys over settings
+    """
+
+    def __init__(self, settings, keys):
+        self.settings = settings
+        self.keys = keys
+        self.tokens = list()
+
+    def __enter__(self):
+        var = install(self.settings, self.keys)
+        overlay = dict(var.get() or ())
+        overlay.update(self.keys)
+        self.tokens.append((var, var.set(overlay)))
+        return self.settings
+
+    def __exit__(self, *exc_info):
+        var, token = self.tokens.pop()
+        var.reset(token)
+
+    def __call__(self, fun):
+        settings, keys = self.settings, self.keys
+        if inspect.iscoroutinefunction(fun):
+            @functools.wraps(fun)
+            async def wrapper(*args, **kwds):
+                with Override(settings, keys):
+                    return await fun(*args, **kwds)
+        else:
+            @functools.wraps(fun)
+            def wrapper(*args, **kwds):
+                with Override(settings, keys):
+                    return fun(*args, **kwds)
+        return wrapper
+
+
+def install(settings, keys):
+    """
+    Return the overlay ContextVar of settings, making keys overridable
+    """
+    cls = settings.__class__
+    with _lock:
+        var = vars(cls).get('SETTINGSD_OVERLAY')
+        if var is None:
+            var = contextvars.ContextVar(
+                'settingsd overlay: {0}'.format(cls.__name__),
+                default=None,
+                )
+            cls.SETTINGSD_OVERLAY = var
+
+        for key in keys:
+            if isinstance(vars(cls).get(key), base.OverriddenKey):
+                continue
+            shadowed = _lookup(cls, key)
+            setattr(cls, key, base.OverriddenKey(key, var, shadowed))
+
+    return var
+
+
+def _lookup(cls, key):
+    for klass in cls.__mro__:
+        if key in vars(klass):
+            return vars(klass)[key]
+    return utils.MISSING
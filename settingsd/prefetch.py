@@ -0,0 +1,136 @@
+# encoding: utf8
+"""
+Concurrent prefetch
+
+With SETTINGSD_PREFETCH = N, Settingsd.iter_parts reads the next few parts
+on a pool of N threads while the current one executes, and compiles those
+bound for the python loader (through SETTINGSD_BYTECODE_CACHE). Parts still
+execute one at a time, in order; a part's get_data() simply returns what
+was already read. Anything prefetched but never yielded, such as when
+assembly fails, is discarded. Requires concurrent.futures.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import functools
+
+from . import cache
+from . import loaders
+from . import utils
+
+
+class Prefetcher(object):
+
+    def __init__(self, settings, workers):
+        from concurrent.futures import ThreadPoolExecutor
+        self.settings = settings
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        # how far ahead of the executing part to read
+        self.window = workers * 2
+        self.pending = dict()
+
+    @classmethod
+    def create(cls, settings):
+        """
+        Return a Prefetcher per SETTINGSD_PREFETCH, or None
+        """
+        workers = utils.getopt(settings, 'SETTINGSD_PREFETCH')
+        if not workers:
+            return None
+
+        try:
+            return cls(settings, int(workers))
+        except ImportError:
+            return None
+
+    def submit(self, cache_key, keys):
+        if cache_key in self.pending:
+            return
+
+        planned = plan(self.settings, keys)
+        if planned is not None:
+            self.pending[cache_key] = self.pool.submit(
+                fetch, keys['get_data'], keys, *planned
+                )
+
+    def take(self, cache_key, keys):
+        """
+        Hand the prefetched data and code, if any, to keys
+        """
+        future = self.pending.pop(cache_key, None)
+        if future is None:
+            return
+
+        try:
+            data, code = future.result()
+        except Exception:
+            # let the loader hit the same error in order
+            return
+
+        hand(keys, data, code)
+
+    def close(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.pool.shutdown(wait=False)
+
+
+def plan(settings, keys):
+    """
+    Return fetch(...) arguments (compiles, path, content) for keys, or None
+    """
+    if keys.get('is_dir') or keys.get('code') is not None:
+        return None
+
+    if keys.get('get_code') is not None:
+        # nothing to read or compile
+        return None
+
+    if not utils.tags_match(settings, keys.get('tags')):
+        # likely skipped; an earlier part may yet change SETTINGSD_TAGS
+        return None
+
+    ns = utils.namespace(settings)
+    loader = ns.resolve_opt('SETTINGSD_LOADER_FROM_KEY', keys['key'])
+    if not loader:
+        loader = ns.resolve_opt('SETTINGSD_LOADER_FROM_EXT', keys['ext'])
+    if not loader or isinstance(loader, type):
+        # unloaded (stored as a path) or a lazy descriptor
+        return None
+
+    path = None
+    compiles = loader is loaders.python
+    kind = compiles and cache.CODE or loader is loaders.json and cache.JSON
+    content = cache.content_cache(settings)
+    if kind and content is not None and content.has(kind, keys):
+        # nothing to read
+        return None
+
+    if compiles:
+        path = cache.bytecode_path(settings, keys)
+    return compiles, path, content
+
+
+def fetch(get_data, keys, compiles, path, content):
+    """
+    Read, and maybe compile, a part; safe to call from any thread
+    """
+    if compiles:
+        return cache.load_code(get_data, keys, path, content)
+    return get_data(), None
+
+
+def hand(keys, data, code):
+    """
+    Make keys return fetched data from get_data() and code to loaders
+    """
+    if data is not utils.MISSING:
+        keys['get_data'] = functools.partial(_identity, data)
+    if code is not None:
+        keys['code'] = code
+
+
+def _identity(data):
+    return data
@@ -0,0 +1,155 @@
+# encoding: utf8
+"""
+Load profiling
+
+With SETTINGSD_PROFILE, assembly records where time goes: finder time per
+path, and per part the time spent reading (get_data), compiling, executing
+and in any other loader work, plus the tracemalloc allocation delta when
+tracemalloc is tracing (SETTINGSD_PROFILE = 'memory' traces assembly).
+Phases are exclusive: time spent reading inside compile is only counted as
+read. Settingsd.instance records type construction and ready().
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import contextlib
+import functools
+import time
+
+from . import utils
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+PHASES = ('read', 'compile', 'exec', 'load')
+
+
+class Profiler(object):
+
+    def __init__(self, memory=False):
+        self.parts = collections.OrderedDict()
+        self.paths = collections.OrderedDict()
+        self.stages = collections.OrderedDict()
+        self.stack = list()
+        self.tracemalloc = None
+        self.started = False
+        try:
+            import tracemalloc
+        except ImportError:
+            return
+
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started = True
+        if tracemalloc.is_tracing():
+            self.tracemalloc = tracemalloc
+
+    def close(self):
+        if self.started:
+            self.tracemalloc.stop()
+            self.started = False
+            self.tracemalloc = None
+
+    def part(self, info):
+        record = collections.OrderedDict((phase, 0.0) for phase in PHASES)
+        record['alloc'] = None
+        self.parts[info['name']] = record
+        return record
+
+    @contextlib.contextmanager
+    def measure(self, record, phase):
+        """
+        Add time spent in the block, minus nested measures, to record[phase]
+        """
+        self.stack.append(0.0)
+        start = timer()
+        try:
+            yield
+        finally:
+            elapsed = timer() - start
+            nested = self.stack.pop()
+            record[phase] = record.get(phase, 0.0) + elapsed - nested
+            if self.stack:
+                self.stack[-1] += elapsed
+
+    @contextlib.contextmanager
+    def allocations(self, record):
+        if self.tracemalloc is None:
+            yield
+            return
+
+        before = self.tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            after = self.tracemalloc.get_traced_memory()[0]
+            record['alloc'] = after - before
+
+    def wrap(self, record, get_data):
+        """
+        Return get_data, measured as read
+        """
+        @functools.wraps(get_data)
+        def timed_get_data(*args, **kwds):
+            with self.measure(record, 'read'):
+                return get_data(*args, **kwds)
+        return timed_get_data
+
+
+@contextlib.contextmanager
+def part(settings, info):
+    """
+    Measure everything done to load the part described by info, if profiling
+    """
+    ns = utils.namespace(settings)
+    profiler = getattr(ns, 'profiler', None)
+    if profiler is None:
+        yield
+        return
+
+    record = profiler.part(info)
+    if 'get_data' in info:
+        info['get_data'] = profiler.wrap(record, info['get_data'])
+    with profiler.allocations(record):
+        with profiler.measure(record, 'load'):
+            yield
+
+
+def path(settings, path):
+    """
+    Measure finding parts on path, if profiling
+    """
+    ns = utils.namespace(settings)
+    profiler = getattr(ns, 'profiler', None)
+    if profiler is None:
+        return _noop()
+    return profiler.measure(profiler.paths, path)
+
+
+def stage(settings, name):
+    """
+    Measure an assembly-wide stage (instance, ready, ...), if profiling
+    """
+    ns = utils.namespace(settings)
+    profiler = getattr(ns, 'profiler', None)
+    if profiler is None:
+        return _noop()
+    return profiler.measure(profiler.stages, name)
+
+
+def measure(settings, keys, phase):
+    """
+    Measure a phase of the part being loaded, if profiling
+    """
+    ns = utils.namespace(settings)
+    profiler = getattr(ns, 'profiler', None)
+    if profiler is None or keys['name'] not in profiler.parts:
+        return _noop()
+    return profiler.measure(profiler.parts[keys['name']], phase)
+
+
+@contextlib.contextmanager
+def _noop():
+    yield
@@ -0,0 +1,121 @@
+# encoding: utf8
+"""
+Compact provenance
+
+Which part wrote which key is recorded as two parallel arrays of ids (key,
+part), with each part name, path and key stored once. The dist (key ->
+part names) and path (part path -> keys) mappings behind trace() and
+source() are rebuilt from those on first use after a write.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import array
+import collections
+import sys
+
+
+try:
+    intern = sys.intern
+except AttributeError:
+    intern = intern
+
+
+class Provenance(object):
+
+    def __init__(self):
+        self.names = list()
+        self.paths = list()
+        self.keys = list()
+        # part id -> path id
+        self.part_path = array.array('I')
+        self.part_ids = dict()
+        self.path_ids = dict()
+        self.key_ids = dict()
+        # one entry per recorded write
+        self.writes_key = array.array('I')
+        self.writes_part = array.array('I')
+        self.current = None
+        self.cache = None
+
+    def enter(self, name, path):
+        """
+        Attribute writes from now on to part name, found in path
+        """
+        part_id = self.part_ids.get((name, path))
+        if part_id is None:
+            path_id = self.path_ids.get(path)
+            if path_id is None:
+                path_id = self.path_ids[path] = len(self.paths)
+                self.paths.append(intern(str(path)))
+            part_id = self.part_ids[(name, path)] = len(self.names)
+            self.names.append(intern(str(name)))
+            self.part_path.append(path_id)
+        self.current = part_id
+
+    def record(self, key):
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        self.writes_key.append(key_id)
+        self.writes_part.append(self.current)
+        self.cache = None
+
+    @property
+    def dist(self):
+        return self.build()[0]
+
+    @property
+    def path(self):
+        return self.build()[1]
+
+    def build(self):
+        if self.cache is not None:
+            return self.cache
+
+        dist = collections.OrderedDict((key, list()) for key in self.keys)
+        path = collections.OrderedDict()
+        for key_id, part_id in zip(self.writes_key, self.writes_part):
+            key = self.keys[key_id]
+            dist[key].append(self.names[part_id])
+            partpath = self.paths[self.part_path[part_id]]
+            if partpath not in path:
+                path[partpath] = list()
+            path[partpath].append(key)
+
+        self.cache = (dist, path)
+        return self.cache
+
+    def dump(self):
+        """
+        Return a marshallable copy of everything recorded
+        """
+        return (
+            list(self.names),
+            list(self.paths),
+            list(self.keys),
+            self.part_path.tolist(),
+            self.writes_key.tolist(),
+            self.writes_part.tolist(),
+            )
+
+    @classmethod
+    def load(cls, state):
+        names, paths, keys, part_path, writes_key, writes_part = state
+        self = cls()
+        self.names = [intern(str(name)) for name in names]
+        self.paths = [intern(str(path)) for path in paths]
+        self.keys = list(keys)
+        self.part_path = array.array('I', part_path)
+        self.part_ids = dict(
+            ((name, self.paths[path_id]), part_id)
+            for part_id, (name, path_id)
+            in enumerate(zip(self.names, self.part_path))
+            )
+        self.path_ids = dict((path, i) for i, path in enumerate(self.paths))
+        self.key_ids = dict((key, i) for i, key in enumerate(self.keys))
+        self.writes_key = array.array('I', writes_key)
+        self.writes_part = array.array('I', writes_part)
+        return self
@@ -0,0 +1,327 @@
+# encoding: utf8
+"""
+Hot reload
+
+Watch every path scanned during assembly and, when a part changes,
+reassemble in the background (incrementally with SETTINGSD_INCREMENTAL).
+The new settings replace the old ones in sys.modules and on the parent
+package only once fully built, so readers never observe a partial
+namespace. Code holding a reference to the old settings object keeps
+seeing the old values; use Reloader.subscribe(...) to be told about changes.
+
+    >>> reloader = settingsd.reloading.watch(settings)
+    >>> reloader.subscribe('DEBUG', lambda key, old, new: ...)
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import logging
+import os
+import select
+import struct
+import threading
+
+from . import finders
+from . import utils
+
+
+log = logging.getLogger(__name__)
+
+
+def watch(settings, interval=1.0, poll=None):
+    """
+    Start watching settings for changes; return the running Reloader
+    """
+    reloader = Reloader(settings, interval=interval, poll=poll)
+    reloader.start()
+    return reloader
+
+
+class Reloader(object):
+    """
+    Reassemble and republish settings whenever its parts change
+    """
+
+    def __init__(self, settings, interval=1.0, poll=None):
+        from .base import FrozenSettings
+        if isinstance(settings, FrozenSettings):
+            # nothing leads back to the namespace that assembled them
+            raise TypeError(
+                'frozen settings cannot be reloaded: {0}'.format(
+                    type(settings).__module__,
+                    ))
+
+        self.settings = settings
+        # published settings may be frozen later on (SETTINGSD_FROZEN)
+        self.namespace = utils.namespace(settings)
+        self.interval = interval
+        self.poll = poll
+        self.subscribers = collections.defaultdict(list)
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def subscribe(self, key, callback):
+        """
+        Call callback(key, old, new) when the value of key changes
+
+        A key of None subscribes to every reload and is called with the old
+        and new settings objects.
+        """
+        with self.lock:
+            self.subscribers[key].append(callback)
+        return callback
+
+    def unsubscribe(self, key, callback):
+        with self.lock:
+            if callback in self.subscribers.get(key, ()):
+                self.subscribers[key].remove(callback)
+
+    def paths(self):
+        """
+        Return every path scanned while assembling the current settings
+        """
+        ns = self.namespace
+        paths = list(ns.scanned)
+        for path in ns['__path__']:
+            if path not in paths:
+                paths.append(path)
+        return paths
+
+    def reload(self):
+        """
+        Reassemble, publish and notify subscribers; return new settings
+        """
+        with self.lock:
+            old = self.settings
+            # in-place edits don't change directory listings
+            for path in self.paths():
+                finders.invalidate(path)
+
+            ns = self.namespace = self.namespace.reassemble()
+            new = self.settings = utils.settings_from_ns(ns, update=True)
+            self.notify(old, new)
+            return new
+
+    def notify(self, old, new):
+        missing = object()
+        for key, callbacks in list(self.subscribers.items()):
+            if key is None:
+                args = (None, old, new)
+            else:
+                old_attr = getattr(old, key, missing)
+                new_attr = getattr(new, key, missing)
+                if old_attr is new_attr or utils.equal(old_attr, new_attr):
+                    continue
+                args = (
+                    key,
+                    None if old_attr is missing else old_attr,
+                    None if new_attr is missing else new_attr,
+                    )
+
+            for callback in list(callbacks):
+                try:
+                    callback(*args)
+                except Exception:
+                    log.exception('settingsd reload callback failed')
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(
+                target=self.run,
+                name='settingsd-reload',
+                )
+            self.thread.daemon = True
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.is_set():
+            watcher = None
+            if not self.poll:
+                watcher = InotifyWatcher.create(self.paths())
+            if watcher is None:
+                watcher = PollingWatcher(self.paths(), self.stopped)
+
+            try:
+                changed = False
+                while not changed and not self.stopped.is_set():
+                    changed = watcher.wait(self.interval)
+            finally:
+                watcher.close()
+
+            if not changed:
+                continue
+
+            # let bursts of writes (editors, rsync, ...) settle
+            self.stopped.wait(min(self.interval, 0.1))
+            try:
+                self.reload()
+            except Exception:
+                log.exception('settingsd reload failed; keeping old settings')
+
+
+class PollingWatcher(object):
+    """
+    Detect changes by comparing stat info of watched paths
+    """
+
+    def __init__(self, paths, stopped=None):
+        self.paths = paths
+        self.stopped = stopped or threading.Event()
+        self.state = self.scan()
+
+    def scan(self):
+        state = list()
+        for path in self.paths:
+            target = _locate(path)
+            if target != path or not os.path.isdir(target):
+                # zip archive, missing path's closest ancestor, or nothing
+                state.append((path, target, target and _stat(target)))
+                continue
+
+            try:
+                names = sorted(os.listdir(target))
+            except OSError:
+                names = list()
+            state.append((path, target, [
+                (name, _stat(os.path.join(target, name)))
+                for name in names
+                if utils.keys_from_uri(name)
+                ]))
+        return state
+
+    def wait(self, timeout):
+        self.stopped.wait(timeout)
+        return self.scan() != self.state
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Detect changes via Linux inotify, through ctypes
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+        IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+        )
+    EVENT = struct.Struct('iIII')
+
+    @classmethod
+    def create(cls, paths):
+        """
+        Return a watcher for paths, or None if inotify is unavailable
+        """
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            libc.inotify_init1
+        except (ImportError, OSError, AttributeError, TypeError):
+            return None
+
+        fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        if fd < 0:
+            return None
+
+        return cls(libc, fd, paths)
+
+    def __init__(self, libc, fd, paths):
+        self.fd = fd
+        # wd -> (any fragment name?, other names of interest)
+        self.watches = dict()
+        for path in paths:
+            target = _locate(path)
+            if not target:
+                continue
+
+            fragments, names = False, set()
+            if not os.path.isdir(target):
+                # a file (zip archive, etc) is watched directly
+                names.add('')
+            elif target != path:
+                # closest ancestor; wait for the path to be created
+                names.add(os.path.relpath(path, target).split(os.sep)[0])
+            else:
+                fragments = True
+
+            wd = libc.inotify_add_watch(
+                fd, os.path.abspath(target).encode('utf8'), self.MASK,
+                )
+            if wd >= 0:
+                # a directory may be both a path and the closest ancestor
+                # of another (missing) one; keep both filters
+                seen = self.watches.get(wd, (False, set()))
+                self.watches[wd] = (fragments or seen[0], names | seen[1])
+
+    def wait(self, timeout):
+        readable = select.select([self.fd], [], [], timeout)[0]
+        if not readable:
+            return False
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError:
+            return False
+
+        changed = False
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf8')
+            offset += length
+            fragments, names = self.watches.get(wd, (False, ()))
+            changed = (
+                changed or name in names or
+                fragments and bool(utils.keys_from_uri(name))
+                )
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _locate(path):
+    """
+    Return path, or its closest existing ancestor, if any
+    """
+    while path:
+        if os.path.exists(path):
+            return path
+        head, tail = os.path.split(path)
+        if not tail or head == path:
+            break
+        path = head
+    return None
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
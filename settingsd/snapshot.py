@@ -0,0 +1,312 @@
+# encoding: utf8
+"""
+Whole-assembly snapshots
+
+A snapshot records the final namespace, provenance and parts of an
+assembly along with a fingerprint of everything that produced it: the
+seeded namespace and every part found on every scanned path. When the
+fingerprint still matches, later assemblies restore the snapshot instead of
+executing parts. Only data-only trees benefit; any value that cannot be
+marshalled (functions, descriptors, ...) and any module bound besides the
+parts themselves, eg. os to read os.environ, disables the snapshot and
+assembly proceeds as usual. Anything else parts read from outside their
+files (the environment, the clock, other files) is frozen at the value it
+had when the snapshot was taken.
+
+SETTINGSD_SHARED is the same for pre-fork servers: the first process to
+assemble (the master, with preload) writes a pickled snapshot, usually to
+/dev/shm, and every later process (the workers) memory maps it instead of
+executing parts. Workers still build private objects from it; what they
+share is the snapshot itself and the work of producing it. share() writes
+one explicitly, eg. from a master hook after a deploy.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import collections
+import hashlib
+import marshal
+import mmap
+import os
+import pickle
+import stat
+import sys
+import types
+
+from . import cache
+from . import utils
+from .provenance import Provenance
+
+
+# bump when the layout of the snapshot changes
+VERSION = 6
+
+
+def seed(settings, opt='SETTINGSD_SNAPSHOT'):
+    """
+    Return a digest of the seeded namespace, or None if opt is unset
+
+    Values that cannot be marshalled, eg. __spec__ and __loader__ from
+    replace(__name__), count by key alone.
+    """
+    if not utils.getopt(settings, opt):
+        return None
+
+    ns = utils.namespace(settings)
+    items = list()
+    for k, v in ns.seed.items():
+        if k == '__builtins__':
+            continue
+        try:
+            items.append((k, marshal.dumps(v)))
+        except ValueError:
+            items.append((k, None))
+
+    data = marshal.dumps((VERSION, cache.magic(), items))
+    return hashlib.sha1(data).hexdigest()
+
+
+def fingerprint(parts):
+    """
+    Return a marshallable identity for the parts found on one path
+    """
+    if parts in (None, False):
+        return None
+
+    fp = list()
+    for part in parts:
+        if not utils.keys_from_uri(part['uri']):
+            continue
+
+        if part.get('mtime') is not None:
+            fp.append((part['uri'], part['mtime'], part.get('size')))
+            continue
+
+        data = part['get_data']()
+        if not isinstance(data, bytes):
+            data = data.encode('utf8')
+        fp.append((part['uri'], hashlib.sha1(data).hexdigest()))
+
+    return tuple(fp)
+
+
+def restore(settings, digest):
+    """
+    Restore settings from SETTINGSD_SNAPSHOT; return True on success
+    """
+    if digest is None:
+        return False
+
+    path = utils.getopt(settings, 'SETTINGSD_SNAPSHOT')
+    try:
+        with open(path, 'rb') as fp:
+            snap = marshal.loads(fp.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return False
+
+    return apply(settings, snap, digest)
+
+
+def save(settings, digest):
+    """
+    Write SETTINGSD_SNAPSHOT for settings; return True on success
+    """
+    if digest is None:
+        return False
+
+    snap = build(settings, digest)
+    if snap is None:
+        return False
+
+    try:
+        data = marshal.dumps(snap)
+    except ValueError:
+        return False
+
+    path = utils.getopt(settings, 'SETTINGSD_SNAPSHOT')
+    return cache.write_atomic(path, data)
+
+
+def attach(settings, digest):
+    """
+    Restore settings from the SETTINGSD_SHARED mapping; return True on success
+    """
+    if digest is None:
+        return False
+
+    path = utils.getopt(settings, 'SETTINGSD_SHARED')
+    try:
+        with open(path, 'rb') as fp:
+            if not _trusted(os.fstat(fp.fileno())):
+                return False
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return False
+
+    try:
+        if sys.version_info[0] < 3:
+            snap = pickle.loads(mapped[:])
+        else:
+            snap = pickle.loads(mapped)
+    except Exception:
+        return False
+    finally:
+        mapped.close()
+
+    return apply(settings, snap, digest)
+
+
+def share(settings, path=None):
+    """
+    Write a shared snapshot of settings for other processes to attach to
+
+    Values must be picklable, neither functions nor classes defined by
+    parts, nor imported modules; otherwise nothing is written, False is
+    returned and every process assembles as usual. Move such code into
+    SETTINGSD_BASES or an importable module so parts only hold data.
+    """
+    ns = utils.namespace(settings)
+    digest = seed(ns, 'SETTINGSD_SHARED')
+    if path is None:
+        path = utils.getopt(ns, 'SETTINGSD_SHARED')
+    if not path or digest is None:
+        return False
+
+    snap = build(ns, digest)
+    if snap is None:
+        return False
+
+    try:
+        data = _dumps(snap, ns['__name__'])
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return False
+
+    # only this user may write what attach(...) unpickles
+    return cache.write_atomic(path, data, mode=0o600)
+
+
+def build(settings, digest):
+    """
+    Return a snapshot of settings, or None if it cannot be restored
+    """
+    ns = utils.namespace(settings)
+    if ns.type_overrides:
+        # descriptors cannot be restored
+        return None
+
+    parts = ns.part[1:]
+    links = dict()
+    seeded = list()
+    items = list()
+    for key, attr in ns.items():
+        if key == '__builtins__':
+            continue
+
+        if key.startswith('__') and attr is ns.seed.get(key, utils.MISSING):
+            # eg. __spec__ and __loader__; the seed matches on restore
+            seeded.append(key)
+            attr = None
+        elif isinstance(attr, types.ModuleType):
+            if attr not in parts:
+                # parts reading os.environ and friends would be frozen
+                return None
+            links[key] = parts.index(attr)
+            attr = None
+        items.append((key, attr))
+
+    return {
+        'seed': digest,
+        'scanned': [
+            (scan_path, fingerprint(scan_parts))
+            for scan_path, scan_parts in ns.scanned.items()
+            ],
+        'parts': [
+            (
+                part.__name__,
+                part.__file__,
+                part.__doc__,
+                [(k, v) for k, v in vars(part).items() if k.isupper()],
+                )
+            for part in parts
+            ],
+        'items': items,
+        'links': links,
+        'seeded': seeded,
+        'guarded': [
+            (name, keys['uri'], keys['tags'])
+            for name, keys in ns.guarded.items()
+            ],
+        'provenance': ns.provenance and ns.provenance.dump(),
+        }
+
+
+def apply(settings, snap, digest):
+    """
+    Replace the namespace with snap if it is still current
+    """
+    ns = utils.namespace(settings)
+    if not isinstance(snap, dict) or snap.get('seed') != digest:
+        return False
+
+    for scan_path, scan_fp in snap['scanned']:
+        if fingerprint(ns.find_parts(scan_path)) != scan_fp:
+            return False
+
+    parts = list()
+    for name, uri, doc, attrs in snap['parts']:
+        part = types.ModuleType(name)
+        part.__file__ = uri
+        part.__doc__ = doc
+        for key, attr in attrs:
+            setattr(part, key, attr)
+        parts.append(part)
+
+    ns.touch()
+    collections.OrderedDict.clear(ns)
+    for key, attr in snap['items']:
+        if key in snap['links']:
+            attr = parts[snap['links'][key]]
+        elif key in snap['seeded']:
+            attr = ns.seed[key]
+        collections.OrderedDict.__setitem__(ns, key, attr)
+
+    ns.part[1:] = parts
+    ns.guarded.clear()
+    for name, uri, tags in snap['guarded']:
+        ns.guarded[name] = {'name': name, 'uri': uri, 'tags': tags}
+    ns.provenance = None
+    if snap['provenance'] is not None:
+        ns.provenance = Provenance.load(snap['provenance'])
+    return True
+
+
+def _trusted(st):
+    # unpickling runs code: refuse files others could have written
+    geteuid = getattr(os, 'geteuid', None)
+    if geteuid is not None and st.st_uid != geteuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _dumps(snap, name):
+    try:
+        from io import BytesIO
+    except ImportError:
+        from StringIO import StringIO as BytesIO
+
+    class Pickler(pickle.Pickler):
+
+        def persistent_id(self, obj):
+            # refuse code that only exists inside the settings module
+            if isinstance(obj, (type, types.FunctionType)):
+                module = getattr(obj, '__module__', None) or ''
+                if module == name or module.startswith(name + '.'):
+                    raise pickle.PicklingError(
+                        '{0!r} is defined by a part'.format(obj),
+                        )
+            return None
+
+    fp = BytesIO()
+    Pickler(fp, pickle.HIGHEST_PROTOCOL).dump(snap)
+    return fp.getvalue()
@@ -0,0 +1,111 @@
+# encoding: utf8
+"""
+Key access statistics
+
+With SETTINGSD_STATS, the class built by Settingsd.instance counts reads of
+uppercase keys through attribute access and __getitem__, along with the
+file and line of each read. Every thread counts into its own dicts, merged
+only when asked (Settingsd.stats()). SETTINGSD_STATS = N counts one in N
+reads per thread and scales the results, trading precision for overhead;
+rarely read keys may then appear unread.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import threading
+
+
+class Counter(object):
+
+    def __init__(self, rate=1):
+        self.rate = max(1, int(rate))
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # [reads, sites, countdown] of every thread that ever counted
+        self.threads = list()
+
+    def state(self):
+        state = [dict(), dict(), self.rate]
+        with self.lock:
+            self.threads.append(state)
+        self.local.state = state
+        return state
+
+    def hit(self, key, depth=2):
+        try:
+            state = self.local.state
+        except AttributeError:
+            state = self.state()
+
+        state[2] -= 1
+        if state[2]:
+            return
+
+        state[2] = self.rate
+        reads, sites = state[0], state[1]
+        reads[key] = reads.get(key, 0) + 1
+        frame = sys._getframe(depth)
+        site = (key, frame.f_code.co_filename, frame.f_lineno)
+        sites[site] = sites.get(site, 0) + 1
+
+    def reads(self):
+        """
+        Return {key: reads} merged across threads
+        """
+        return self.merge(0)
+
+    def sites(self):
+        """
+        Return {(key, filename, lineno): reads} merged across threads
+        """
+        return self.merge(1)
+
+    def merge(self, which):
+        with self.lock:
+            states = list(self.threads)
+
+        merged = dict()
+        for state in states:
+            for key, n in _items(state[which]):
+                merged[key] = merged.get(key, 0) + n * self.rate
+        return merged
+
+    def reset(self):
+        with self.lock:
+            for state in self.threads:
+                state[0].clear()
+                state[1].clear()
+
+
+def instrument(cls, counter):
+    """
+    Count reads of uppercase keys on instances of cls
+    """
+    getattribute = cls.__getattribute__
+    getitem = cls.__getitem__
+    hit = counter.hit
+
+    def __getattribute__(self, key):
+        if key.isupper() and not key.startswith('SETTINGSD_'):
+            hit(key)
+        return getattribute(self, key)
+
+    def __getitem__(self, key):
+        if key.isupper() and not key.startswith('SETTINGSD_'):
+            hit(key)
+        return getitem(self, key)
+
+    cls.__getattribute__ = __getattribute__
+    cls.__getitem__ = __getitem__
+    return cls
+
+
+def _items(counts):
+    # other threads may be counting; retry rather than lock the hot path
+    while True:
+        try:
+            return list(counts.items())
+        except RuntimeError:
+            continue
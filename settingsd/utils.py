@@ -12,6 +12,16 @@ import os.path
 import re
 import sys
 
+try:
+    from types import MappingProxyType
+except ImportError:
+    # read-only views are best effort before python 3.3
+    MappingProxyType = dict
+
+
+# fragments are named like 10-name.ext or _10_name.ext
+FRAGMENT_RE = re.compile('^_?([0-9]+)[-_](.+)$')
+
 
 def namespace(settings):
     """
@@ -43,7 +53,25 @@ def resolve_bases(settings, bases):
     return resolved
 
 
+# sentinel for missing keys and defaults, see getdefault(...)
+MISSING = object()
+
+# uppercase names in settingsd.defaults: (shared read-only, original)
+_defaults = dict()
+_NO_DEFAULT = (MISSING, MISSING)
+
+# memoized resolve_import results: (importable, level, package) -> object
+_imports = dict()
+
+
 def resolve_import(settings, importable):
+    """
+    Import 'module:attr' (optionally relative to settings), memoized
+    """
+    if hasattr(importable, '__call__'):
+        # already resolved
+        return importable
+
     ns = namespace(settings)
     level, module, attr = 0, importable, None
 
@@ -61,8 +89,15 @@ def resolve_import(settings, importable):
             module = module[i:]
             break
 
+    package = None
+    if level:
+        package = ns.get('__package__') or ns.get('__name__')
+    memo_key = (importable, level, package)
+    if memo_key in _imports:
+        return _imports[memo_key]
+
     # perform import!
-    importable = __import__(
+    resolved = __import__(
         name=module,
         globals=ns,
         locals=ns,
@@ -71,44 +106,84 @@ def resolve_import(settings, importable):
         level=level,
         )
     if attr:
-        importable = getattr(importable, attr)
+        resolved = getattr(resolved, attr)
 
-    return importable
+    _imports[memo_key] = resolved
+    return resolved
 
 
 def getopt(settings, key, strict=False, copy=False):
     """
     Get an option from settings or defaults with optional copy
     """
-    from . import defaults
-
     ns = namespace(settings)
     if ns.__contains__(key):
         return ns.__getitem__(key)
 
     # usually fallback to None
-    args = [defaults, key, None]
-    if strict:
-        args.pop()
-    default = getattr(*args)
-    if copy:
-        from copy import deepcopy
-        default = deepcopy(default)
+    default = getdefault(key, copy=copy)
+    if default is MISSING:
+        if strict:
+            raise AttributeError(key)
+        default = None
 
     return default
 
 
+def getdefault(key, copy=False):
+    """
+    Return the default for key from settingsd.defaults, or MISSING
+
+    Lists, sets and dicts are shared read-only, as tuples, frozensets and
+    mapping proxies, unless copy is requested. Other defaults are returned
+    as-is either way.
+    """
+    if not _defaults:
+        from . import defaults
+        for name, attr in vars(defaults).items():
+            if name.isupper():
+                _defaults[name] = (_freeze(attr), attr)
+
+    frozen, attr = _defaults.get(key, _NO_DEFAULT)
+    if copy and frozen is not attr:
+        from copy import deepcopy
+        return deepcopy(attr)
+    return frozen
+
+
+def equal(a, b):
+    """
+    Compare values that may refuse comparison (eg. numpy arrays); False then
+    """
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _freeze(attr):
+    if isinstance(attr, list):
+        return tuple(attr)
+    if isinstance(attr, (set, frozenset)):
+        return frozenset(attr)
+    if isinstance(attr, dict):
+        return MappingProxyType(attr)
+    return attr
+
+
 def keys_from_uri(uri):
     keys = {'uri': uri}
     keys['head'], keys['tail'] = os.path.split(keys['uri'])
     keys['name'], keys['ext'] = os.path.splitext(keys['tail'])
-    matcher = re.compile('^_?([0-9]+)[-_](.+)$')
-    match = matcher.match(keys['name'])
+    match = FRAGMENT_RE.match(keys['name'])
     if not match:
         return None
 
     keys['index'] = int(match.group(1))
-    keys['key'] = match.group(2)
+    # guard tags: 50-cache@prod.py, 50-debug@!prod.py, ...
+    tags = match.group(2).split('@')
+    keys['key'] = tags.pop(0)
+    keys['tags'] = tuple(tag for tag in tags if tag)
     keys['key'] = re.sub('[^0-9A-Za-z]', '_', keys['key'])
     keys['key'] = re.sub('_{2,}', '_', keys['key'])
     keys['key'] = keys['key'].upper()
@@ -116,6 +191,27 @@ def keys_from_uri(uri):
     return keys
 
 
+def tags_match(settings, tags):
+    """
+    Return True if SETTINGSD_TAGS satisfies every guard tag (or !tag)
+    """
+    if not tags:
+        return True
+
+    active = getopt(settings, 'SETTINGSD_TAGS') or ()
+    if hasattr(active, 'split'):
+        active = active.replace(',', ' ').split()
+    active = set(active)
+    for tag in tags:
+        if tag.startswith('!'):
+            if tag[1:] in active:
+                return False
+        elif tag not in active:
+            return False
+
+    return True
+
+
 def ns_prepare(sources, install=True):
     """
     Unify an arbitrary number of sources into a namespace
@@ -180,12 +276,14 @@ def ns_prepare(sources, install=True):
 
 def settings_from_ns(ns, update=True):
     """
-    Assemble settings from a namespace
+    Assemble settings from a namespace, or publish an assembled one
     """
     from . import base
 
     # assemble settings
-    settings_ns = base.Settingsd(ns)
+    settings_ns = ns
+    if not isinstance(settings_ns, base.Settingsd):
+        settings_ns = base.Settingsd(ns)
     settings = settings_ns.instance
 
     if update:
@@ -0,0 +1,90 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import importlib
+import os
+import sys
+
+import pytest
+
+import settingsd
+from settingsd import finders
+
+
+# prepended to Python parts of Trees made with hits=True
+HIT = '__import__({0!r}).hits.RAN.append({1!r})\n'
+
+
+class Tree(object):
+    """
+    An importable package with a settings.d directory of parts
+
+    With hits, every Python part records its run (its index, eg. '10') in
+    the package's hits module; see ran().
+    """
+
+    def __init__(self, root, name, hits=False):
+        self.name = name
+        self.root = root / name
+        self.path = self.root / 'settings.d'
+        self.path.mkdir(parents=True)
+        (self.root / '__init__.py').write_text(u'')
+        self.hits = hits
+        if hits:
+            (self.root / 'hits.py').write_text(u'RAN = []\n')
+
+    def write(self, name, data):
+        """
+        Create or edit a part in place; its mtime always moves forward
+        """
+        path = self.path / name
+        if self.hits and name.endswith('.py'):
+            data = HIT.format(self.name + '.hits', name.split('-')[0]) + data
+        old = path.stat().st_mtime if path.exists() else None
+        if isinstance(data, bytes):
+            path.write_bytes(data)
+        else:
+            path.write_text(data)
+        if old is not None:
+            # even on filesystems with coarse timestamps
+            os.utime(str(path), (old + 1, old + 1))
+        return path
+
+    def remove(self, name):
+        (self.path / name).unlink()
+
+    def ran(self):
+        """
+        Return the indexes of the parts run since the last call, sorted
+        """
+        hits = importlib.import_module(self.name + '.hits')
+        rv, hits.RAN[:] = sorted(hits.RAN), []
+        return rv
+
+    def install(self, **opts):
+        return settingsd.install(self.name, **opts)
+
+
+@pytest.fixture
+def make_tree(tmp_path, monkeypatch):
+    """
+    Return a factory of Trees: make_tree({'10-a.py': 'A = 1\\n'}, ...)
+    """
+    monkeypatch.syspath_prepend(str(tmp_path))
+    made = list()
+
+    def make_tree(parts=(), name='tapp', hits=False):
+        for module in list(sys.modules):
+            if module == name or module.startswith(name + '.'):
+                monkeypatch.delitem(sys.modules, module)
+        tree = Tree(tmp_path, name, hits=hits)
+        for part, data in dict(parts).items():
+            tree.write(part, data)
+        importlib.import_module(name)
+        made.append(tree)
+        return tree
+
+    yield make_tree
+    finders.invalidate()
@@ -0,0 +1,110 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import types
+
+import pytest
+
+import settingsd
+from settingsd import base
+from settingsd import utils
+
+
+def test_seed_without_file(make_tree, monkeypatch):
+    tree = make_tree({'10-a.py': 'A = 1\n'})
+    monkeypatch.setitem(sys.modules, 'nofile', types.ModuleType('nofile'))
+    for prune in (False, True):
+        settings = settingsd.replace({
+            '__name__': 'nofile.settings',
+            '__path__': [str(tree.path)],
+            'SETTINGSD_PRUNE_PARTS': prune,
+            })
+        assert settings.A == 1
+        assert ('A', ['10-a']) in utils.namespace(settings).trace()
+
+
+def test_registry_edited_in_place(make_tree):
+    tree = make_tree({
+        '15-x.py': 'SETTINGSD_LOADER_FROM_EXT\n',
+        '20-a.json': '{"A": 1}',
+        '25-b.py': 'SETTINGSD_LOADER_FROM_EXT[".json"] = '
+                   '"settingsd.loaders:JSONLoader"\n',
+        '30-c.json': '{"C": 1}',
+        })
+    settings = tree.install()
+    overrides = utils.namespace(settings).type_overrides
+    assert sorted(overrides) == ['C']
+    assert settings.A == 1
+    assert settings.C == {'C': 1}
+
+
+def test_frozen_instance_cached(make_tree):
+    tree = make_tree({
+        '10-a.py': 'A = 1\nREADY = []\n'
+                   'def ready(self):\n    READY.append(self.A)\n',
+        })
+    ns = utils.namespace(tree.install())
+    ns['SETTINGSD_FROZEN'] = True
+    frozen = ns.instance
+    assert ns.instance is frozen
+    assert ns['READY'] == [1, 1]
+    ns['A'] = 2
+    assert ns.instance.A == 2
+    assert ns.instance is ns.instance
+    assert ns['READY'] == [1, 1, 2]
+    ns['SETTINGSD_FROZEN'] = False
+    ns['A'] = 3
+    assert not isinstance(ns.instance, base.FrozenSettings)
+    assert ns.instance.A == 3
+
+
+@pytest.mark.parametrize('frozen', [False, True])
+def test_override_membership(make_tree, frozen):
+    pytest.importorskip('contextvars')
+    tree = make_tree({'10-a.py': 'A = 1\n'})
+    settings = tree.install(SETTINGSD_FROZEN=frozen)
+    size = len(settings)
+    assert 'NEW' not in settings
+    with settings.override(NEW=1, A=2):
+        assert 'NEW' in settings and 'A' in settings
+        assert settings['NEW'] == 1
+        assert list(settings).count('A') == 1
+        assert list(settings)[-1] == 'NEW'
+        assert len(settings) == size + 1
+    assert 'NEW' not in settings
+    assert 'NEW' not in list(settings)
+    assert len(settings) == size
+
+
+def test_instance_updates(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\nB = 2\nC = 3\n'})
+    settings = tree.install()
+    ns = utils.namespace(settings)
+    cls = type(settings)
+
+    # edit in place: same object, same class
+    ns['A'] = 10
+    assert ns.instance is settings and type(ns.instance) is cls
+    assert settings.A == 10
+
+    # removal
+    del ns['B']
+    assert ns.instance is settings
+    assert not hasattr(settings, 'B')
+    assert ns.pop('C') == 3
+    assert ns.instance is settings
+    assert not hasattr(settings, 'C')
+    ns['D'] = 4
+    assert ns.popitem() == ('D', 4)
+    assert not hasattr(ns.instance, 'D')
+
+    # clear: everything may have changed, build anew
+    seed = dict(ns)
+    ns.clear()
+    ns.update((k, v) for k, v in seed.items() if k != 'A')
+    assert ns.instance is not settings
+    assert not hasattr(ns.instance, 'A')
+    assert ns.instance is ns.instance
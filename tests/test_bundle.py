@@ -0,0 +1,39 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pytest
+
+from settingsd import bundle
+from settingsd import utils
+
+
+PARTS = {
+    '10-a.py': 'SETTINGSD_PRUNE_PARTS = True\nA = 1\n',
+    '20-b.json': '{"B": [1, 2]}',
+    }
+
+
+def test_pruned_parts_bundled(make_tree, tmp_path):
+    tree = make_tree(PARTS)
+    ns = utils.namespace(tree.install())
+    assert ns.part[1:] == []
+    out = str(tmp_path / 'tapp.bundle')
+    assert bundle.build(ns, out) == 2
+
+    for name in PARTS:
+        tree.remove(name)
+    settings = tree.install(SETTINGSD_BUNDLE=out)
+    assert settings.A == 1
+    assert settings.B == [1, 2]
+
+
+def test_refuse_empty_bundle(make_tree, tmp_path):
+    tree = make_tree(PARTS)
+    ns = utils.namespace(tree.install())
+    ns.pruned = ()
+    out = tmp_path / 'tapp.bundle'
+    with pytest.raises(ValueError):
+        bundle.build(ns, str(out))
+    assert not out.exists()
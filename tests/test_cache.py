@@ -0,0 +1,83 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import marshal
+import sys
+
+import pytest
+
+from settingsd import cache
+from settingsd import defaults
+
+
+CONTENT = dict(SETTINGSD_CONTENT_CACHE=1024 * 1024)
+
+
+@pytest.fixture(autouse=True)
+def clear():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_content_cache_opt_in():
+    assert not defaults.SETTINGSD_CONTENT_CACHE
+
+
+def test_content_cache_edit_in_place(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\n', '20-b.json': '{"B": 1}'})
+    settings = tree.install(**CONTENT)
+    assert (settings.A, settings.B) == (1, 1)
+    settings = tree.install(**CONTENT)
+    assert cache.stats()['hits'] == 2
+    tree.write('10-a.py', 'A = 2\n')
+    tree.write('20-b.json', '{"B": 2}')
+    settings = tree.install(**CONTENT)
+    assert (settings.A, settings.B) == (2, 2)
+
+
+def test_content_cache_removal_and_clear(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\n', '20-b.py': 'B = 1\n'})
+    tree.install(**CONTENT)
+    tree.remove('20-b.py')
+    settings = tree.install(**CONTENT)
+    assert settings.A == 1 and not hasattr(settings, 'B')
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+    hits = cache.stats()['hits']
+    assert tree.install(**CONTENT).A == 1
+    assert cache.stats()['hits'] == hits
+
+
+def test_bytecode_stamps(make_tree, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    tree = make_tree({'10-a.py': 'A = 1\n', '20-b.py': 'B = 1\n'})
+    tree.install()
+    pyc = tree.path / '__pycache__' / '10-a.py.{0}.pyc'.format(
+        cache.cache_tag())
+    assert pyc.exists()
+
+    # a fresh stamp is trusted as is
+    with pyc.open('rb') as fp:
+        stamp = marshal.load(fp)
+    code = compile('A = 99\n', stamp[1], 'exec')
+    pyc.write_bytes(marshal.dumps(stamp) + marshal.dumps(code))
+    assert tree.install().A == 99
+
+    # edit in place, same size: only the mtime differs
+    tree.write('10-a.py', 'A = 2\n')
+    assert tree.install().A == 2
+    with pyc.open('rb') as fp:
+        assert marshal.load(fp) != stamp
+
+    # a removed cache file is written again
+    pyc.unlink()
+    assert tree.install().A == 2
+    assert pyc.exists()
+
+    # a removed part is gone, whatever its cache file says
+    tree.remove('20-b.py')
+    assert not hasattr(tree.install(), 'B')
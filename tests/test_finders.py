@@ -0,0 +1,74 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import zipfile
+
+import pytest
+
+from settingsd import finders
+
+
+@pytest.fixture
+def archive(make_tree):
+    tree = make_tree()
+    path = str(tree.root / 'parts.zip')
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('10-doc.json', '{"a": 1}')
+
+    def install(**opts):
+        return tree.install(
+            __path__=[path],
+            SETTINGSD_LOADER_FROM_EXT={
+                '.json': 'settingsd.loaders:JSONLoader',
+                },
+            **opts
+            )
+    install.path = path
+    return install
+
+
+def test_lazy_member_after_archive_touched(archive):
+    settings = archive()
+    st = os.stat(archive.path)
+    os.utime(archive.path, (st.st_atime, st.st_mtime + 1))
+    archive()
+    assert settings.DOC == {'a': 1}
+
+
+@pytest.mark.parametrize('mmap', [False, True])
+def test_lazy_member_after_invalidate(archive, mmap):
+    settings = archive(SETTINGSD_ZIPFILE_MMAP=mmap)
+    finders.invalidate()
+    archive(SETTINGSD_ZIPFILE_MMAP=mmap)
+    assert settings.DOC == {'a': 1}
+
+
+def test_listing_edit_add_remove(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\n'})
+    path = str(tree.path)
+    assert tree.install().A == 1
+    st = os.stat(path)
+
+    def keep_mtime():
+        os.utime(path, (st.st_atime, st.st_mtime))
+
+    # edit in place: the directory mtime stays, the part is stat'ed anyway
+    tree.write('10-a.py', 'A = 22\n')
+    keep_mtime()
+    assert tree.install().A == 22
+
+    # an entry added behind the listing's back is only seen once forgotten
+    tree.write('20-b.py', 'B = 1\n')
+    keep_mtime()
+    assert not hasattr(tree.install(), 'B')
+    finders.invalidate(path)
+    assert tree.install().B == 1
+
+    # removal changes the directory mtime
+    tree.remove('20-b.py')
+    os.utime(path, (st.st_atime, st.st_mtime + 1))
+    assert not hasattr(tree.install(), 'B')
+    assert len(finders.directory(None, path)) == 1
@@ -0,0 +1,106 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pytest
+
+from settingsd import utils
+
+
+PARTS = {
+    '05-conf.py': 'SETTINGSD_TAGS = ["prod"]\n',
+    '10-base.py': 'BASE = 1\nAPPS = ["a"]\n',
+    '20-apps.py': 'APPS += ["b"]\n',
+    '30-indep.py': 'INDEP = 1\n',
+    '40-derived.py': 'DERIVED = BASE * 10\n',
+    '45-peek.py': 'PEEK = globals().get("BASE", 0) + ("INDEP" in globals())\n',
+    '50-cache@prod.py': 'CACHE = "redis"\n',
+    '50-debug@!prod.py': 'DEBUG = True\n',
+    '60-data.json': '{"J": [1, 2]}',
+    '99-local.py': 'LOCAL = DERIVED + len(APPS)\n',
+    }
+
+
+@pytest.fixture
+def tree(make_tree):
+    return make_tree(PARTS, hits=True)
+
+
+def assemble(tree):
+    return tree.install(SETTINGSD_INCREMENTAL=True)
+
+
+def state(settings):
+    ns = utils.namespace(settings)
+    return (
+        [(k, v) for k, v in ns.items() if k.isupper() or k == '__path__'],
+        ns.trace(),
+        [part.__name__ for part in ns.part],
+        dict((k, v) for k, v in vars(type(settings)).items() if k.isupper()),
+        )
+
+
+def check(tree, settings):
+    """
+    Reassemble; compare with a full assembly and return what executed
+    """
+    tree.ran()
+    ns = utils.namespace(settings).reassemble()
+    new = utils.settings_from_ns(ns)
+    executed = tree.ran()
+    assert state(new) == state(assemble(tree))
+    tree.ran()
+    return new, executed
+
+
+def test_unchanged(tree):
+    settings = assemble(tree)
+    settings, executed = check(tree, settings)
+    assert executed == []
+
+
+def test_leaf_edit(tree):
+    settings = assemble(tree)
+    tree.write('99-local.py', 'LOCAL = -1\n')
+    settings, executed = check(tree, settings)
+    assert executed == ['99']
+    assert settings.LOCAL == -1
+
+
+def test_upstream_edit(tree):
+    settings = assemble(tree)
+    tree.write('10-base.py', 'BASE = 2\nAPPS = ["z"]\n')
+    settings, executed = check(tree, settings)
+    assert executed == ['10', '20', '40', '45', '99']
+    assert settings.DERIVED == 20
+    assert settings.APPS == ['z', 'b']
+    assert settings.LOCAL == 22
+    assert settings.PEEK == 3
+
+
+def test_read_through_globals(tree):
+    settings = assemble(tree)
+    tree.write('30-indep.py', 'OTHER = 1\n')
+    settings, executed = check(tree, settings)
+    assert executed == ['30', '45']
+    assert settings.PEEK == 1
+
+
+def test_removed_part(tree):
+    settings = assemble(tree)
+    tree.remove('30-indep.py')
+    settings, executed = check(tree, settings)
+    assert executed == ['45']
+    assert not hasattr(settings, 'INDEP')
+
+
+def test_settingsd_change(tree):
+    settings = assemble(tree)
+    assert settings.CACHE == 'redis'
+    tree.write('05-conf.py', 'SETTINGSD_TAGS = ["dev"]\n')
+    settings, executed = check(tree, settings)
+    # config changed: everything after it executes again
+    assert executed == ['05', '10', '20', '30', '40', '45', '50', '99']
+    assert settings.DEBUG is True
+    assert not hasattr(settings, 'CACHE')
@@ -0,0 +1,93 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+
+import pytest
+
+from settingsd import loaders
+from settingsd import utils
+
+
+def assemble(make_tree, data, **opts):
+    tree = make_tree({'10-doc.json': data}, name='jsonstream')
+    opts['SETTINGSD_LOADER_FROM_EXT'] = {
+        '.json': 'settingsd.loaders:json_stream',
+        }
+    return tree.install(**opts)
+
+
+def public(settings, doc):
+    return dict((k, getattr(settings, k)) for k in doc)
+
+
+@pytest.mark.parametrize('window', range(4, 12))
+def test_numbers_split_across_windows(make_tree, monkeypatch, window):
+    monkeypatch.setattr(loaders, '_JSON_WINDOW', window)
+    doc = {
+        'a': 1.5,
+        'bb': -12e3,
+        'ccc': 123456789,
+        'd': 0.25,
+        'e': [1, 22.5, 3e-2],
+        'f': 7,
+        }
+    data = json.dumps(doc, sort_keys=True).encode('utf8')
+    settings = assemble(make_tree, data)
+    assert public(settings, doc) == doc
+
+
+@pytest.mark.parametrize('window', range(4, 12))
+def test_multibyte_at_window_boundary(make_tree, monkeypatch, window):
+    monkeypatch.setattr(loaders, '_JSON_WINDOW', window)
+    doc = {
+        u'\xe9t\xe9': u'caf\xe9',
+        u'euro': u'€€€',
+        u'clef': u'\U0001d11e',
+        u'mixed': [u'\xe9', 1.5, {u'€': u'\U0001d11e'}],
+        }
+    data = json.dumps(doc, ensure_ascii=False).encode('utf8')
+    settings = assemble(make_tree, data)
+    assert utils.namespace(settings)[u'\xe9t\xe9'] == u'caf\xe9'
+    assert settings.euro == doc['euro']
+    assert settings.clef == doc['clef']
+    assert settings.mixed == doc['mixed']
+
+
+@pytest.mark.parametrize('window', [4, 7, 1 << 20])
+def test_large_members_deferred(make_tree, monkeypatch, window):
+    monkeypatch.setattr(loaders, '_JSON_WINDOW', window)
+    doc = {
+        'SMALL': 1,
+        'BIG': {'items': list(range(50)), 'name': u'€' * 10},
+        'TEXT': u'\xe9' * 40,
+        'LAST': [1.5],
+        }
+    data = json.dumps(doc, ensure_ascii=False).encode('utf8')
+    settings = assemble(make_tree, data, SETTINGSD_JSON_LAZY_BYTES=16)
+    overrides = utils.namespace(settings).type_overrides
+    assert sorted(k for k in doc if k in overrides) == ['BIG', 'TEXT']
+    assert isinstance(overrides['BIG'], loaders.JSONLoader)
+    assert public(settings, doc) == doc
+
+
+@pytest.mark.parametrize('data', [
+    b'[1, 2]',
+    b'{"a" 1}',
+    b'{"a": 1,}',
+    b'{"a": 1 "b": 2}',
+    b'{"a": tru}',
+    b'{"a": 1.}',
+    b'{"a": "open',
+    b'{"a": 1} {}',
+    b'{"a": 1',
+    b'{a: 1}',
+    ])
+@pytest.mark.parametrize('window', [4, 1 << 20])
+def test_malformed(make_tree, monkeypatch, data, window):
+    monkeypatch.setattr(loaders, '_JSON_WINDOW', window)
+    with pytest.raises(ValueError) as info:
+        assemble(make_tree, data)
+    assert '10-doc.json' in str(info.value)
@@ -0,0 +1,51 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pytest
+
+from settingsd import reloading
+
+
+@pytest.fixture
+def inotify():
+    watchers = list()
+
+    def inotify(paths):
+        watcher = reloading.InotifyWatcher.create(paths)
+        if watcher is None:
+            pytest.skip('inotify unavailable')
+        watchers.append(watcher)
+        return watcher
+
+    yield inotify
+    for watcher in watchers:
+        watcher.close()
+
+
+def test_inotify_ancestor_of_missing_path(tmp_path, inotify):
+    # tmp_path is watched for fragments and for local/ to appear
+    watcher = inotify([str(tmp_path), str(tmp_path / 'local')])
+    (tmp_path / '10-a.py').write_text(u'A = 1\n')
+    assert watcher.wait(1)
+    (tmp_path / 'other.txt').write_text(u'')
+    assert not watcher.wait(0)
+    (tmp_path / 'local').mkdir()
+    assert watcher.wait(1)
+
+
+def test_frozen_rejected(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\n'})
+    settings = tree.install(SETTINGSD_FROZEN=True)
+    with pytest.raises(TypeError):
+        reloading.Reloader(settings)
+
+
+def test_reload_once_frozen(make_tree):
+    tree = make_tree({'10-a.py': 'A = 1\n'})
+    reloader = reloading.Reloader(tree.install())
+    tree.write('20-b.py', 'B = 2\nSETTINGSD_FROZEN = True\n')
+    assert reloader.reload().B == 2
+    tree.write('10-a.py', 'A = 3\n')
+    assert reloader.reload().A == 3
@@ -0,0 +1,55 @@
+# encoding: utf8
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import pytest
+
+
+@pytest.fixture(params=['SETTINGSD_SNAPSHOT', 'SETTINGSD_SHARED'])
+def tree(request, make_tree, tmp_path):
+    parts = {'10-a.py': 'A = 1\n', '20-b.py': 'B = [A]\n'}
+    tree = make_tree(parts, hits=True)
+    snap = tmp_path / 'snap.bin'
+    tree.snap = snap
+    tree.install_snap = lambda: tree.install(**{request.param: str(snap)})
+    return tree
+
+
+def test_restored_until_changed(tree):
+    settings = tree.install_snap()
+    assert tree.ran() == ['10', '20']
+    assert tree.snap.exists()
+
+    settings = tree.install_snap()
+    assert tree.ran() == []
+    assert (settings.A, settings.B) == (1, [1])
+
+    # edit in place, same size
+    tree.write('10-a.py', 'A = 2\n')
+    settings = tree.install_snap()
+    assert tree.ran() == ['10', '20']
+    assert settings.B == [2]
+    tree.install_snap()
+    assert tree.ran() == []
+
+    # added and removed parts
+    tree.write('30-c.py', 'C = 3\n')
+    assert tree.install_snap().C == 3
+    assert tree.ran() == ['10', '20', '30']
+    tree.remove('20-b.py')
+    settings = tree.install_snap()
+    assert tree.ran() == ['10', '30']
+    assert not hasattr(settings, 'B')
+
+
+def test_removed_snapshot(tree):
+    tree.install_snap()
+    tree.ran()
+    tree.snap.unlink()
+    settings = tree.install_snap()
+    assert tree.ran() == ['10', '20']
+    assert settings.B == [1]
+    assert tree.snap.exists()
+    tree.install_snap()
+    assert tree.ran() == []